@@ -1,14 +1,55 @@
 from __future__ import annotations
 
+import base64
 import csv
+import gzip
+import hashlib
 import io
+import json
+import math
+import mmap
+import multiprocessing
 import os
 import random
+import re
 import sqlite3
-from statistics import mean
-from typing import Any
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import accumulate
+from operator import add, mul
+from typing import Any, Callable, Iterable, Iterator
 
-from flask import Flask, Response, g, jsonify, redirect, render_template, request, url_for
+import click
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    stream_with_context,
+    url_for,
+)
+
+try:
+    import orjson
+except ImportError:  # Optional faster encoder; the stdlib json module is used otherwise.
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional; without it only gzip is negotiated.
+    brotli = None
 
 SUBJECT_META = [
     ("chinese", "语文", 150),
@@ -25,10 +66,115 @@ SUBJECT_MAX = {code: max_score for code, _, max_score in SUBJECT_META}
 LABEL_TO_CODE = {label: code for code, label, _ in SUBJECT_META}
 TOTAL_EXPR = "(chinese + math + english + physics + chemistry + biology)"
 TOTAL_MAX = 750
+STUDENT_COLUMNS = "id, name, chinese, math, english, physics, chemistry, biology, total"
+STUDENT_FIELDS = STUDENT_COLUMNS.split(", ")
+COLUMNAR_MIMETYPE = "application/vnd.scoreatlas.columns+json"
+RANK_ORDER = "total DESC, chinese DESC, math DESC, english DESC, id ASC"
+RANK_KEY_COLUMNS = ["total", "chinese", "math", "english"]
+PAGE_SIZE_MAX = 1000
+NAME_INDEX_MIN_CHARS = 3
+EXPORT_BATCH_SIZE = 1000
+CSV_HEADER = ["排名", "姓名", "语文", "数学", "英语", "物理", "化学", "生物", "总分"]
+IMPORT_BATCH_SIZE = 2000
+IMPORT_BATCH_MAX = 20000
+IMPORT_ERROR_LIMIT = 1000
+IMPORT_MODES = ("append", "replace", "upsert")
+IMPORT_STAGING_TABLE = "temp.import_staging"
+BATCH_OPERATIONS_MAX = 5000
+BATCH_OPERATION_TYPES = ("insert", "delete", "subject", "update")
+INSERT_STUDENT_SQL = (
+    "INSERT INTO students (name, chinese, math, english, physics, chemistry, biology) "
+    "VALUES (:name, :chinese, :math, :english, :physics, :chemistry, :biology)"
+)
+# SQLite only treats an index as covering for a table with generated columns
+# when every stored column is in it, so the timestamps ride along at the end.
+RANK_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_students_rank
+    ON students (
+        total DESC, chinese DESC, math DESC, english DESC, id,
+        physics, chemistry, biology, name, created_at, updated_at
+    )
+"""
+# (subject, total) so a subject range is an index range and a subject sort,
+# tie-broken by total then id, is an index walk in either direction.
+SUBJECT_INDEX_SQL = {
+    code: f"CREATE INDEX IF NOT EXISTS idx_students_{code} ON students ({code}, total)" for code in SUBJECT_CODES
+}
+SORT_KEYS = ("total", *SUBJECT_CODES)
+# Relative cost of reading a row through a subject index (a table lookup per
+# row) versus the sequential, covering rank index.
+INDEX_LOOKUP_COST = 4
+GENERATE_BATCH_SIZE = 50000
+SCATTER_POINTS_DEFAULT = 2000
+SCATTER_POINTS_MAX = 20000
+DASHBOARD_PAGE_SIZE = 100
+DASHBOARD_FILTERS_MAX = 8
+ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+CHANGES_PAGE_SIZE = 500
+# Delete tombstones kept in the change log. Past twice this many, the oldest
+# are trimmed back to it and clients behind the trimmed seq get reset=true.
+CHANGE_LOG_TOMBSTONES = 10000
+CHANGES_PAGE_MAX = 5000
+EXAM_ID_PATTERN = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+EXAM_NAME_MAX_LENGTH = 100
+DEFAULT_EXAM = "default"
+CROSS_EXAM_MAX = 64
+EXAM_UNSCOPED_ROUTES = ("/api/health", "/api/metrics", "/api/exams")
+# Endpoints that can add or remove students; only these refresh the catalog's
+# per-exam student count.
+EXAM_COUNT_ENDPOINTS = frozenset(
+    {"add_student", "delete_student", "batch_students", "import_json", "import_stream", "seed_students"}
+)
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
-DB_PATH = os.path.join(DATA_DIR, "scores.db")
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "docs", "data")
+SNAPSHOT_KINDS = ("stats", "students")
+SNAPSHOT_STUDENT_LIMIT = 100
+DB_PATH = os.getenv("SCOREATLAS_DB_PATH") or os.path.join(DATA_DIR, "scores.db")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("SCOREATLAS_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_KIB = int(os.getenv("SCOREATLAS_DB_CACHE_KIB", "16384"))
+DB_MMAP_BYTES = int(os.getenv("SCOREATLAS_DB_MMAP_BYTES", str(256 * 1024 * 1024)))
+DB_STATEMENT_CACHE = int(os.getenv("SCOREATLAS_DB_STATEMENT_CACHE", "256"))
+POOL_EXAM_CONNECTIONS = int(os.getenv("SCOREATLAS_DB_EXAM_CONNECTIONS", "4"))
+RESPONSE_CACHE_ENTRIES = int(os.getenv("SCOREATLAS_CACHE_ENTRIES", "256"))
+RESPONSE_CACHE_BYTES = int(os.getenv("SCOREATLAS_CACHE_BYTES", str(64 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = int(os.getenv("SCOREATLAS_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("SCOREATLAS_COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("SCOREATLAS_COMPRESS_BROTLI_QUALITY", "5"))
+COLUMN_STORE_ENABLED = os.getenv("SCOREATLAS_COLUMN_STORE", "1") != "0"
+COLUMN_STORE_DIR = os.getenv("SCOREATLAS_COLUMN_STORE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), "columns"
+)
+EXAMS_DIR = os.getenv("SCOREATLAS_EXAMS_DIR") or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "exams")
+COLUMN_STORE_LOCK_SECONDS = 300
+COLUMN_STORE_REBUILD_SECONDS = float(os.getenv("SCOREATLAS_COLUMN_STORE_REBUILD_SECONDS", "1"))
+COLUMN_FILE_MAGIC = b"SACOLS01"
+COLUMN_FILE_HEADER = struct.Struct("=8sQQ32s8x")
+# Every server worker gets its own pool, so the default stays well under one
+# process per CPU.
+PARALLEL_STATS_WORKERS = int(os.getenv("SCOREATLAS_STATS_WORKERS", "0")) or min(4, max(1, (os.cpu_count() or 1) // 2))
+PARALLEL_STATS_MIN_ROWS = int(os.getenv("SCOREATLAS_PARALLEL_STATS_MIN_ROWS", "200000"))
+WRITE_BATCH_MAX = int(os.getenv("SCOREATLAS_WRITE_BATCH_MAX", "64"))
+WRITE_BATCH_DELAY_MS = float(os.getenv("SCOREATLAS_WRITE_BATCH_DELAY_MS", "0"))
+METRICS_ENABLED = os.getenv("SCOREATLAS_METRICS", "1") != "0"
+SEED_SAMPLE_ENABLED = os.getenv("SCOREATLAS_SEED_SAMPLE", "1") != "0"
+METRICS_DIR = os.getenv("SCOREATLAS_METRICS_DIR") or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "metrics")
+METRICS_FLUSH_SECONDS = float(os.getenv("SCOREATLAS_METRICS_FLUSH_SECONDS", "2"))
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+# Bump whenever init_db gains a table, trigger, index or migration; databases
+# already at this version skip straight past the schema setup on start.
+SCHEMA_VERSION = 2
+WARMUP_ENABLED = os.getenv("SCOREATLAS_WARMUP", "0") == "1"
+WARMUP_PATHS = tuple(
+    path.strip()
+    for path in os.getenv(
+        "SCOREATLAS_WARMUP_PATHS",
+        "/api/stats?series=compact,/api/dashboard?page_size=1000,/api/students?page_size=200&with_count=1",
+    ).split(",")
+    if path.strip()
+)
 
 SURNAMES = [
     "王", "李", "张", "刘", "陈", "杨", "赵", "黄", "周", "吴", "徐", "孙", "胡", "朱", "高", "林",
@@ -66,41 +212,245 @@ TIER_CONFIG = [
 ]
 
 
+np: Any = None
+numpy_loaded = False
+
+
+def load_numpy() -> Any:
+    # NumPy is imported on first use rather than at import time: it is the
+    # heaviest import a worker pays for, and requests that never touch the
+    # vectorised paths should not wait for it. A warmed master loads it before
+    # forking so the workers inherit the module.
+    global np, numpy_loaded
+    if not numpy_loaded:
+        try:
+            import numpy
+        except ImportError:  # NumPy is optional; the stats kernel falls back to pure Python.
+            numpy = None
+        np, numpy_loaded = numpy, True
+    return np
+
+
 def clamp(value: float, low: int, high: int) -> int:
     return int(max(low, min(high, value)))
 
 
-def pearson(xs: list[float], ys: list[float]) -> float:
-    if len(xs) != len(ys) or len(xs) < 2:
-        return 0.0
-    mx = sum(xs) / len(xs)
-    my = sum(ys) / len(ys)
-    num = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
-    den_x = sum((x - mx) ** 2 for x in xs) ** 0.5
-    den_y = sum((y - my) ** 2 for y in ys) ** 0.5
-    if den_x == 0 or den_y == 0:
-        return 0.0
-    return round(num / (den_x * den_y), 4)
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(time.perf_counter() - started)
+
+    def executemany(self, sql: str, parameters: Iterable[Any]) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            metrics.observe_query(time.perf_counter() - started)
+
+    # SQLite does most of a SELECT's work while stepping, so fetches count as SQL time.
+    def fetchone(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            metrics.observe_sql(time.perf_counter() - started)
+
+    def fetchmany(self, size: int | None = None) -> list[Any]:
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            metrics.observe_sql(time.perf_counter() - started)
+
+    def fetchall(self) -> list[Any]:
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            metrics.observe_sql(time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory: Callable[..., sqlite3.Cursor] | None = None) -> sqlite3.Cursor:
+        return super().cursor(factory or TimedCursor)
+
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters: Iterable[Any]) -> sqlite3.Cursor:
+        return self.cursor().executemany(sql, parameters)
+
+    def commit(self) -> None:
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            metrics.observe_sql(time.perf_counter() - started)
+
+
+def open_connection(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=DB_STATEMENT_CACHE,
+        factory=TimedConnection if METRICS_ENABLED else sqlite3.Connection,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.pid = os.getpid()
+        self.local = threading.local()
+        self.counters = {"opened": 0, "reused": 0, "rolledBack": 0, "evicted": 0}
+        self.open_connections = 0
+
+    def acquire(self, path: str) -> sqlite3.Connection:
+        if os.getpid() != self.pid:
+            # Connections must never cross a fork (gunicorn --preload).
+            with self.lock:
+                if os.getpid() != self.pid:
+                    self._reset()
+        connections = getattr(self.local, "connections", None)
+        if connections is None:
+            connections = self.local.connections = OrderedDict()
+            self.local.busy = Counter()
+
+        conn = connections.get(path)
+        with self.lock:
+            if conn is None:
+                conn = connections[path] = open_connection(path)
+                self.counters["opened"] += 1
+                self.open_connections += 1
+            else:
+                connections.move_to_end(path)
+                self.counters["reused"] += 1
+        self.local.busy[path] += 1
+        self.evict_idle(connections)
+        return conn
+
+    def evict_idle(self, connections: OrderedDict[str, sqlite3.Connection]) -> None:
+        # Every exam file a thread touches would otherwise keep a connection,
+        # with its page cache and mmap, until the thread exits. The main
+        # database stays open; idle exam connections beyond the limit are
+        # closed least recently used first.
+        idle = [path for path in connections if path != DB_PATH and not self.local.busy[path]]
+        excess = sum(1 for path in connections if path != DB_PATH) - POOL_EXAM_CONNECTIONS
+        for path in idle[: max(excess, 0)]:
+            connections.pop(path).close()
+            del self.local.busy[path]
+            with self.lock:
+                self.counters["evicted"] += 1
+                self.open_connections -= 1
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+            with self.lock:
+                self.counters["rolledBack"] += 1
+        busy = getattr(self.local, "busy", None)
+        if busy is None:
+            return
+        for path, pooled in self.local.connections.items():
+            if pooled is conn:
+                busy[path] -= 1
+                if busy[path] <= 0:
+                    del busy[path]
+                break
+
+    def close_local(self) -> None:
+        connections = getattr(self.local, "connections", None) or {}
+        with self.lock:
+            for conn in connections.values():
+                conn.close()
+            self.open_connections -= len(connections)
+        connections.clear()
+        busy = getattr(self.local, "busy", None)
+        if busy is not None:
+            busy.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {"pid": self.pid, "open": self.open_connections, **self.counters}
+
+
+connection_pool = ConnectionPool()
+
+
+def database_path() -> str:
+    return g.get("db_path", DB_PATH)
 
 
 def get_db() -> sqlite3.Connection:
     if "db" not in g:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        g.db = conn
+        g.db = connection_pool.acquire(database_path())
     return g.db
 
 
 def close_db(_: Any = None) -> None:
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        connection_pool.release(db)
+
+
+@contextmanager
+def use_database(path: str) -> Iterator[sqlite3.Connection]:
+    if path == database_path():
+        yield get_db()
+        return
+    saved = {key: g.pop(key) for key in ("db", "db_path") if key in g}
+    g.db_path = path
+    try:
+        yield get_db()
+    finally:
+        close_db()
+        g.pop("db_path", None)
+        for key, value in saved.items():
+            setattr(g, key, value)
+
+
+def schema_objects() -> set[str]:
+    return {
+        "students",
+        "trg_students_updated_at",
+        "idx_students_rank",
+        "idx_change_log_tombstones",
+        *(f"idx_students_{code}" for code in SUBJECT_CODES),
+        *maintenance_trigger_sql(),
+    }
+
+
+def schema_is_current(db: sqlite3.Connection) -> bool:
+    global name_index_available
+    if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        return False
+    # The version alone is not enough: a bulk load that died between dropping
+    # and recreating its triggers and indexes leaves the schema incomplete.
+    names = {row[0] for row in db.execute("SELECT name FROM sqlite_master")}
+    name_index_available = "students_name_fts" in names
+    return schema_objects() <= names
 
 
 def init_db() -> None:
     db = get_db()
+    if schema_is_current(db):
+        return
     db.executescript(
-        """
+        f"""
         CREATE TABLE IF NOT EXISTS students (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT UNIQUE NOT NULL,
@@ -111,7 +461,8 @@ def init_db() -> None:
             chemistry INTEGER NOT NULL CHECK(chemistry >= 0 AND chemistry <= 100),
             biology INTEGER NOT NULL CHECK(biology >= 0 AND biology <= 100),
             created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            total INTEGER GENERATED ALWAYS AS {TOTAL_EXPR} STORED
         );
 
         CREATE TRIGGER IF NOT EXISTS trg_students_updated_at
@@ -122,36 +473,592 @@ def init_db() -> None:
         END;
         """
     )
+    migrate_total_column(db)
+    init_aggregate_store(db)
+    init_version_store(db)
+    init_change_log(db)
+    init_name_index(db)
+    db.execute(RANK_INDEX_SQL)
+    for sql in SUBJECT_INDEX_SQL.values():
+        db.execute(sql)
+    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    db.commit()
+
+
+def init_catalog() -> None:
+    # The catalog lives in the main database; every exam keeps its students in
+    # its own file so per-exam queries never touch another exam's rows.
+    db = get_db()
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS exams (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            cohort TEXT NOT NULL DEFAULT '',
+            held_on TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            student_count INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    # The catalog keeps each exam's student count so listing exams never opens
+    # every exam file; writes through the API and the CLI keep it current.
+    if "student_count" not in {row[1] for row in db.execute("PRAGMA table_info(exams)")}:
+        db.execute("ALTER TABLE exams ADD COLUMN student_count INTEGER NOT NULL DEFAULT 0")
+        db.commit()
+        for (exam_id,) in db.execute("SELECT id FROM exams").fetchall():
+            record_exam_count(exam_id)
     db.commit()
 
 
+prepared_databases: set[str] = set()
+prepared_lock = threading.Lock()
+
+
+def exam_database_path(exam_id: str) -> str:
+    if exam_id == DEFAULT_EXAM:
+        return DB_PATH
+    return os.path.join(EXAMS_DIR, f"{exam_id}.db")
+
+
+def prepare_database(path: str) -> None:
+    if path in prepared_databases:
+        return
+    with prepared_lock:
+        if path not in prepared_databases:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with use_database(path):
+                init_db()
+            prepared_databases.add(path)
+
+
+def exam_to_dict(row: sqlite3.Row) -> dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "cohort": row["cohort"],
+        "heldOn": row["held_on"],
+        "createdAt": row["created_at"],
+        "count": row["student_count"],
+    }
+
+
+def find_exam(exam_id: str) -> dict[str, Any] | None:
+    if exam_id == DEFAULT_EXAM:
+        return {
+            "id": DEFAULT_EXAM,
+            "name": "默认考试",
+            "cohort": "",
+            "heldOn": None,
+            "createdAt": None,
+            "count": count_exam_students(DEFAULT_EXAM),
+        }
+    with use_database(DB_PATH) as db:
+        row = db.execute(
+            "SELECT id, name, cohort, held_on, created_at, student_count FROM exams WHERE id = ?", (exam_id,)
+        ).fetchone()
+    return exam_to_dict(row) if row is not None else None
+
+
+def list_exams() -> list[dict[str, Any]]:
+    with use_database(DB_PATH) as db:
+        rows = db.execute(
+            "SELECT id, name, cohort, held_on, created_at, student_count FROM exams ORDER BY held_on DESC, id"
+        ).fetchall()
+    return [find_exam(DEFAULT_EXAM)] + [exam_to_dict(row) for row in rows]
+
+
+def count_exam_students(exam_id: str) -> int:
+    path = exam_database_path(exam_id)
+    prepare_database(path)
+    with use_database(path) as db:
+        return db.execute("SELECT n FROM stats_moments WHERE id = 1").fetchone()[0]
+
+
+def record_exam_count(exam_id: str) -> None:
+    count = count_exam_students(exam_id)
+    with use_database(DB_PATH) as db:
+        with db:
+            db.execute("UPDATE exams SET student_count = ? WHERE id = ?", (count, exam_id))
+
+
+def parse_exam_payload(payload: dict[str, Any]) -> dict[str, Any]:
+    exam_id = str(payload.get("id", "")).strip().lower()
+    if not EXAM_ID_PATTERN.fullmatch(exam_id) or exam_id == DEFAULT_EXAM:
+        raise ValueError("考试编号只能包含小写字母、数字、- 和 _，且不能为 default")
+    name = str(payload.get("name", "")).strip()
+    if not name:
+        raise ValueError("考试名称不能为空")
+    if len(name) > EXAM_NAME_MAX_LENGTH:
+        raise ValueError(f"考试名称长度不能超过 {EXAM_NAME_MAX_LENGTH}")
+    return {
+        "id": exam_id,
+        "name": name,
+        "cohort": str(payload.get("cohort") or "").strip(),
+        "held_on": str(payload.get("held_on") or "").strip() or None,
+    }
+
+
+def create_exam(exam: dict[str, Any]) -> dict[str, Any]:
+    with use_database(DB_PATH) as db:
+        with db:
+            db.execute(
+                "INSERT INTO exams (id, name, cohort, held_on) VALUES (:id, :name, :cohort, :held_on)",
+                exam,
+            )
+    prepare_database(exam_database_path(exam["id"]))
+    return find_exam(exam["id"])
+
+
+def select_exam(exam_id: str) -> bool:
+    if exam_id == DEFAULT_EXAM:
+        return True
+    if find_exam(exam_id) is None:
+        return False
+    path = exam_database_path(exam_id)
+    prepare_database(path)
+    close_db()
+    g.db_path = path
+    g.exam = exam_id
+    return True
+
+
+def parse_exam_list(value: str) -> list[str]:
+    exam_ids = list(dict.fromkeys(item.strip().lower() for item in value.split(",") if item.strip()))
+    if not exam_ids:
+        raise ValueError("exams 不能为空")
+    if len(exam_ids) > CROSS_EXAM_MAX:
+        raise ValueError(f"最多同时统计 {CROSS_EXAM_MAX} 场考试")
+    return exam_ids
+
+
+def init_version_store(db: sqlite3.Connection) -> None:
+    db.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK(id = 1),
+            version INTEGER NOT NULL DEFAULT 0,
+            epoch TEXT NOT NULL,
+            tombstones INTEGER NOT NULL DEFAULT 0,
+            trimmed_seq INTEGER NOT NULL DEFAULT 0
+        );
+
+        INSERT OR IGNORE INTO data_version (id, version, epoch) VALUES (1, 0, lower(hex(randomblob(4))));
+        """
+    )
+    columns = {row[1] for row in db.execute("PRAGMA table_info(data_version)")}
+    for column in ("tombstones", "trimmed_seq"):
+        if column not in columns:
+            db.execute(f"ALTER TABLE data_version ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+    create_triggers(db, version_trigger_sql())
+
+
+def version_trigger_sql() -> dict[str, str]:
+    score_columns = ", ".join(SUBJECT_CODES)
+    return {
+        "trg_version_insert": """
+            CREATE TRIGGER IF NOT EXISTS trg_version_insert
+            AFTER INSERT ON students
+            BEGIN
+                UPDATE data_version SET version = version + 1 WHERE id = 1;
+            END
+        """,
+        "trg_version_delete": """
+            CREATE TRIGGER IF NOT EXISTS trg_version_delete
+            AFTER DELETE ON students
+            BEGIN
+                UPDATE data_version SET version = version + 1 WHERE id = 1;
+            END
+        """,
+        "trg_version_update": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_version_update
+            AFTER UPDATE OF name, {score_columns} ON students
+            BEGIN
+                UPDATE data_version SET version = version + 1 WHERE id = 1;
+            END
+        """,
+    }
+
+
+def init_change_log(db: sqlite3.Connection) -> None:
+    # One entry per student, replaced on every change, plus at most
+    # 2 * CHANGE_LOG_TOMBSTONES delete tombstones.
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL UNIQUE,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_change_log_tombstones ON change_log (seq) WHERE deleted = 1")
+    db.execute("UPDATE data_version SET tombstones = (SELECT COUNT(1) FROM change_log WHERE deleted = 1) WHERE id = 1")
+    create_triggers(db, change_log_trigger_sql())
+
+
+def change_log_trigger_sql() -> dict[str, str]:
+    score_columns = ", ".join(SUBJECT_CODES)
+    return {
+        "trg_changes_insert": """
+            CREATE TRIGGER IF NOT EXISTS trg_changes_insert
+            AFTER INSERT ON students
+            BEGIN
+                DELETE FROM change_log WHERE student_id = NEW.id;
+                INSERT INTO change_log (student_id, deleted) VALUES (NEW.id, 0);
+            END
+        """,
+        "trg_changes_delete": """
+            CREATE TRIGGER IF NOT EXISTS trg_changes_delete
+            AFTER DELETE ON students
+            BEGIN
+                DELETE FROM change_log WHERE student_id = OLD.id;
+                INSERT INTO change_log (student_id, deleted) VALUES (OLD.id, 1);
+                UPDATE data_version SET tombstones = tombstones + 1 WHERE id = 1;
+            END
+        """,
+        "trg_changes_update": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_changes_update
+            AFTER UPDATE OF name, {score_columns} ON students
+            BEGIN
+                DELETE FROM change_log WHERE student_id = NEW.id;
+                INSERT INTO change_log (student_id, deleted) VALUES (NEW.id, 0);
+            END
+        """,
+        "trg_changes_trim": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_changes_trim
+            AFTER UPDATE OF tombstones ON data_version
+            WHEN NEW.tombstones > {2 * CHANGE_LOG_TOMBSTONES}
+            BEGIN
+                UPDATE data_version SET
+                    trimmed_seq = COALESCE(
+                        (
+                            SELECT seq FROM change_log WHERE deleted = 1
+                            ORDER BY seq DESC LIMIT 1 OFFSET {CHANGE_LOG_TOMBSTONES}
+                        ),
+                        trimmed_seq
+                    ),
+                    tombstones = {CHANGE_LOG_TOMBSTONES}
+                WHERE id = 1;
+                DELETE FROM change_log
+                WHERE deleted = 1 AND seq <= (SELECT trimmed_seq FROM data_version WHERE id = 1);
+            END
+        """,
+    }
+
+
+def reset_change_log(db: sqlite3.Connection) -> None:
+    # A new epoch tells every change feed client to reload in full.
+    db.execute("DELETE FROM change_log")
+    db.execute("UPDATE data_version SET epoch = lower(hex(randomblob(4))), tombstones = 0 WHERE id = 1")
+
+
+def current_change_seq(db: sqlite3.Connection) -> int:
+    row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def fetch_changes(since: int | None, limit: int = CHANGES_PAGE_SIZE, epoch: str | None = None) -> dict[str, Any]:
+    db = get_db()
+    columns = ", ".join(f"s.{column}" for column in STUDENT_FIELDS[1:])
+    rows: list[tuple[Any, ...]] = []
+    db.execute("BEGIN")
+    try:
+        current_epoch, trimmed = db.execute("SELECT epoch, trimmed_seq FROM data_version WHERE id = 1").fetchone()
+        latest = current_change_seq(db)
+        count = db.execute("SELECT n FROM stats_moments WHERE id = 1").fetchone()[0]
+        if since is None:
+            # Clients start from the head version and then load the table in full.
+            since = latest
+        # A version from another epoch, from the future, or older than the
+        # trimmed tombstones cannot be replayed.
+        reset = since > latest or since < trimmed or (epoch is not None and epoch != current_epoch)
+        if not reset:
+            cursor = db.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(
+                f"""
+                SELECT c.seq, c.student_id, c.deleted, s.updated_at, {columns}
+                FROM change_log c LEFT JOIN students s ON s.id = c.student_id
+                WHERE c.seq > ?
+                ORDER BY c.seq
+                LIMIT ?
+                """,
+                (since, limit + 1),
+            ).fetchall()
+    finally:
+        db.rollback()
+
+    more = len(rows) > limit
+    changes = []
+    for seq, student_id, deleted, updated_at, *values in rows[:limit]:
+        change: dict[str, Any] = {"seq": seq, "id": student_id, "op": "delete" if deleted else "upsert"}
+        if not deleted:
+            change["student"] = tuple_to_student((student_id, *values))
+            change["updatedAt"] = updated_at
+        changes.append(change)
+    return {
+        "epoch": current_epoch,
+        "since": since,
+        "version": changes[-1]["seq"] if more else latest,
+        "reset": reset,
+        "more": more,
+        "count": count,
+        "changes": changes,
+    }
+
+
+def create_triggers(db: sqlite3.Connection, triggers: dict[str, str]) -> None:
+    for sql in triggers.values():
+        db.execute(sql)
+
+
+def maintenance_trigger_sql() -> dict[str, str]:
+    triggers = {**stats_trigger_sql(), **version_trigger_sql(), **change_log_trigger_sql()}
+    if name_index_available:
+        triggers.update(name_index_trigger_sql())
+    return triggers
+
+
+name_index_available = True
+
+
+def init_name_index(db: sqlite3.Connection) -> None:
+    global name_index_available
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students_name_fts'"
+    ).fetchone()
+    try:
+        db.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS students_name_fts
+            USING fts5(name, content='students', content_rowid='id', tokenize='trigram')
+            """
+        )
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5 (or older than 3.34, which added trigram).
+        name_index_available = False
+        return
+    create_triggers(db, name_index_trigger_sql())
+    if not exists:
+        db.execute("INSERT INTO students_name_fts (students_name_fts) VALUES ('rebuild')")
+
+
+def name_index_trigger_sql() -> dict[str, str]:
+    return {
+        "trg_students_fts_insert": """
+            CREATE TRIGGER IF NOT EXISTS trg_students_fts_insert
+            AFTER INSERT ON students
+            BEGIN
+                INSERT INTO students_name_fts (rowid, name) VALUES (NEW.id, NEW.name);
+            END
+        """,
+        "trg_students_fts_delete": """
+            CREATE TRIGGER IF NOT EXISTS trg_students_fts_delete
+            AFTER DELETE ON students
+            BEGIN
+                INSERT INTO students_name_fts (students_name_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+            END
+        """,
+        "trg_students_fts_update": """
+            CREATE TRIGGER IF NOT EXISTS trg_students_fts_update
+            AFTER UPDATE OF name ON students
+            BEGIN
+                INSERT INTO students_name_fts (students_name_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+                INSERT INTO students_name_fts (rowid, name) VALUES (NEW.id, NEW.name);
+            END
+        """,
+    }
+
+
+def uses_name_index(keyword: str) -> bool:
+    return (
+        name_index_available
+        and len(keyword) >= NAME_INDEX_MIN_CHARS
+        and "%" not in keyword
+        and "_" not in keyword
+    )
+
+
+def name_filter_sql(keyword: str) -> str:
+    if uses_name_index(keyword):
+        return " AND id IN (SELECT rowid FROM students_name_fts WHERE name LIKE ?)"
+    return " AND name LIKE ?"
+
+
+def current_data_version(db: sqlite3.Connection) -> str:
+    epoch, version = db.execute("SELECT epoch, version FROM data_version WHERE id = 1").fetchone()
+    return f"{epoch}.{version}"
+
+
+def migrate_total_column(db: sqlite3.Connection) -> None:
+    columns = {row["name"] for row in db.execute("PRAGMA table_xinfo(students)")}
+    if "total" in columns:
+        return
+    # SQLite cannot add a STORED generated column in place; the VIRTUAL one is
+    # materialised by idx_students_rank, which is what the queries read.
+    db.execute(f"ALTER TABLE students ADD COLUMN total INTEGER GENERATED ALWAYS AS {TOTAL_EXPR} VIRTUAL")
+
+
+SUBJECT_PAIRS = [
+    (i, j) for i in range(len(SUBJECT_CODES)) for j in range(i, len(SUBJECT_CODES))
+]
+MOMENT_COLUMNS = (
+    ["n"]
+    + [f"sum_{code}" for code in SUBJECT_CODES]
+    + [f"prod_{SUBJECT_CODES[i]}_{SUBJECT_CODES[j]}" for i, j in SUBJECT_PAIRS]
+)
+
+
+def moment_deltas(ref: str) -> list[str]:
+    return (
+        ["1"]
+        + [f"{ref}.{code}" for code in SUBJECT_CODES]
+        + [f"{ref}.{SUBJECT_CODES[i]} * {ref}.{SUBJECT_CODES[j]}" for i, j in SUBJECT_PAIRS]
+    )
+
+
+def moment_update_sql(sign: str, ref: str) -> str:
+    assignments = ", ".join(
+        f"{column} = {column} {sign} {delta}" for column, delta in zip(MOMENT_COLUMNS, moment_deltas(ref))
+    )
+    return f"UPDATE stats_moments SET {assignments} WHERE id = 1;"
+
+
+def total_count_sql(sign: str, ref: str) -> str:
+    start = 1 if sign == "+" else -1
+    return (
+        f"INSERT INTO stats_total_counts (total, count) VALUES ({ref}.total, {start}) "
+        f"ON CONFLICT(total) DO UPDATE SET count = count {sign} 1;"
+    )
+
+
+def score_count_sql(sign: str, ref: str) -> str:
+    start = 1 if sign == "+" else -1
+    values = ", ".join(f"('{code}', {ref}.{code}, {start})" for code in SUBJECT_CODES)
+    return (
+        f"INSERT INTO stats_score_counts (subject, score, count) VALUES {values} "
+        f"ON CONFLICT(subject, score) DO UPDATE SET count = count {sign} 1;"
+    )
+
+
+def init_aggregate_store(db: sqlite3.Connection) -> None:
+    moment_defs = ",\n".join(f"            {column} INTEGER NOT NULL DEFAULT 0" for column in MOMENT_COLUMNS)
+    has_score_counts = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_score_counts'"
+    ).fetchone()
+    db.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS stats_moments (
+            id INTEGER PRIMARY KEY CHECK(id = 1),
+{moment_defs}
+        );
+
+        CREATE TABLE IF NOT EXISTS stats_total_counts (
+            total INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS stats_score_counts (
+            subject TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (subject, score)
+        ) WITHOUT ROWID;
+        """
+    )
+    create_triggers(db, stats_trigger_sql())
+    created = db.execute("INSERT OR IGNORE INTO stats_moments (id) VALUES (1)").rowcount
+    if created or not has_score_counts:
+        rebuild_aggregates(db)
+
+
+def stats_trigger_sql() -> dict[str, str]:
+    score_columns = ", ".join(SUBJECT_CODES)
+    return {
+        "trg_stats_insert": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_stats_insert
+            AFTER INSERT ON students
+            FOR EACH ROW
+            BEGIN
+                {moment_update_sql("+", "NEW")}
+                {total_count_sql("+", "NEW")}
+            END
+        """,
+        "trg_stats_delete": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_stats_delete
+            AFTER DELETE ON students
+            FOR EACH ROW
+            BEGIN
+                {moment_update_sql("-", "OLD")}
+                {total_count_sql("-", "OLD")}
+            END
+        """,
+        "trg_stats_update": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_stats_update
+            AFTER UPDATE OF {score_columns} ON students
+            FOR EACH ROW
+            BEGIN
+                {moment_update_sql("-", "OLD")}
+                {total_count_sql("-", "OLD")}
+                {moment_update_sql("+", "NEW")}
+                {total_count_sql("+", "NEW")}
+            END
+        """,
+        "trg_score_counts_insert": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_score_counts_insert
+            AFTER INSERT ON students
+            FOR EACH ROW
+            BEGIN
+                {score_count_sql("+", "NEW")}
+            END
+        """,
+        "trg_score_counts_delete": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_score_counts_delete
+            AFTER DELETE ON students
+            FOR EACH ROW
+            BEGIN
+                {score_count_sql("-", "OLD")}
+            END
+        """,
+        "trg_score_counts_update": f"""
+            CREATE TRIGGER IF NOT EXISTS trg_score_counts_update
+            AFTER UPDATE OF {score_columns} ON students
+            FOR EACH ROW
+            BEGIN
+                {score_count_sql("-", "OLD")}
+                {score_count_sql("+", "NEW")}
+            END
+        """,
+    }
+
+
+def iter_unique_names(count: int, rand: Any = random) -> Iterator[str]:
+    base = len(GIVEN_CHARS)
+    single_space = len(SURNAMES) * base
+    double_space = single_space * base
+    singles = min(single_space, round(count * 0.25))
+    doubles = min(double_space, count - singles)
+    names = [SURNAMES[i // base] + GIVEN_CHARS[i % base] for i in rand.sample(range(single_space), singles)]
+    names.extend(
+        SURNAMES[i // (base * base)] + GIVEN_CHARS[i // base % base] + GIVEN_CHARS[i % base]
+        for i in rand.sample(range(double_space), doubles)
+    )
+    rand.shuffle(names)
+    yield from names
+
+    # Past the ~113k distinct names, reuse them with a numeric suffix.
+    pool = len(names)
+    for index in range(pool, count):
+        yield f"{names[index % pool]}{index // pool + 1}"
+
+
 def generate_names(count: int) -> list[str]:
-    names: list[str] = []
-    used = set()
-    attempts = 0
-    max_attempts = count * 60
-
-    while len(names) < count and attempts < max_attempts:
-        surname = random.choice(SURNAMES)
-        given_len = 1 if random.random() < 0.25 else 2
-        given = "".join(random.choice(GIVEN_CHARS) for _ in range(given_len))
-        full_name = f"{surname}{given}"
-        if full_name not in used:
-            names.append(full_name)
-            used.add(full_name)
-        attempts += 1
-
-    while len(names) < count:
-        fallback = f"学生{len(names) + 1:02d}"
-        if fallback not in used:
-            names.append(fallback)
-            used.add(fallback)
-
-    return names
-
-
-def sample_tier() -> dict[str, Any]:
-    p = random.random()
+    return list(iter_unique_names(count))
+
+
+def sample_tier(rand: Any = random) -> dict[str, Any]:
+    p = rand.random()
     total = 0.0
     for tier in TIER_CONFIG:
         total += tier["prob"]
@@ -160,64 +1067,165 @@ def sample_tier() -> dict[str, Any]:
     return TIER_CONFIG[-1]
 
 
-def weighted_dirichlet(alpha: list[float]) -> list[float]:
-    raw = [random.gammavariate(a, 1.0) for a in alpha]
+def weighted_dirichlet(alpha: list[float], rand: Any = random) -> list[float]:
+    raw = [rand.gammavariate(a, 1.0) for a in alpha]
     total = sum(raw)
     if total == 0:
         return [1 / len(alpha)] * len(alpha)
     return [v / total for v in raw]
 
 
-def rebalance_scores(scores: list[int], target_total: int, mins: list[int], maxs: list[int]) -> list[int]:
+def rebalance_scores(
+    scores: list[int], target_total: int, mins: list[int], maxs: list[int], rand: Any = random
+) -> list[int]:
     adjusted = [clamp(s, mins[i], maxs[i]) for i, s in enumerate(scores)]
     diff = target_total - sum(adjusted)
-    guard = 0
+    if diff == 0:
+        return adjusted
 
-    while diff != 0 and guard < 10000:
-        if diff > 0:
-            candidates = [i for i in range(len(adjusted)) if adjusted[i] < maxs[i]]
-            if not candidates:
-                break
-            idx = random.choice(candidates)
-            adjusted[idx] += 1
-            diff -= 1
+    # Spread the difference in proportion to each subject's headroom, then hand
+    # the rounding remainder out one point at a time to random subjects with room.
+    step = 1 if diff > 0 else -1
+    room = [maxs[i] - s if step > 0 else s - mins[i] for i, s in enumerate(adjusted)]
+    capacity = sum(room)
+    need = min(abs(diff), capacity)
+    if need == 0:
+        return adjusted
+    shares = [r * need // capacity for r in room]
+    open_slots = [i for i in range(len(shares)) if shares[i] < room[i]]
+    for idx in rand.sample(open_slots, need - sum(shares)):
+        shares[idx] += 1
+    return [s + step * shares[i] for i, s in enumerate(adjusted)]
+
+
+def rebalance_score_matrix(
+    scores: np.ndarray, targets: np.ndarray, mins: np.ndarray, maxs: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    adjusted = np.clip(scores, mins, maxs)
+    diff = targets - adjusted.sum(axis=1)
+    step = np.sign(diff)[:, None]
+    room = np.where(step > 0, maxs - adjusted, adjusted - mins)
+    room[diff == 0] = 0
+    capacity = room.sum(axis=1)
+    need = np.minimum(np.abs(diff), capacity)
+    shares = room * need[:, None] // np.maximum(capacity, 1)[:, None]
+    remainder = need - shares.sum(axis=1)
+    keys = rng.random(room.shape)
+    keys[shares >= room] = 2.0
+    ranks = keys.argsort(axis=1).argsort(axis=1)
+    shares += ranks < remainder[:, None]
+    return adjusted + step * shares
+
+
+def generate_score_matrix(count: int, rng: np.random.Generator) -> np.ndarray:
+    tiers = rng.choice(len(TIER_CONFIG), size=count, p=[tier["prob"] for tier in TIER_CONFIG])
+    means = np.array([tier["mean"] for tier in TIER_CONFIG], dtype=np.float64)[tiers]
+    stds = np.array([tier["std"] for tier in TIER_CONFIG], dtype=np.float64)[tiers]
+    lows = np.array([tier["range"][0] for tier in TIER_CONFIG])[tiers]
+    highs = np.array([tier["range"][1] for tier in TIER_CONFIG])[tiers]
+    targets = np.clip(rng.normal(means, stds), lows, highs).astype(np.int64)
+
+    mins = np.array([tier["mins"] for tier in TIER_CONFIG], dtype=np.int64)[tiers]
+    maxs = np.array([SUBJECT_MAX[code] for code in SUBJECT_CODES], dtype=np.int64)
+    subjects = len(SUBJECT_CODES)
+
+    alpha = np.tile(np.array([3.3, 3.3, 3.1, 2.1, 1.9, 1.8]), (count, 1))
+    strength_count = np.where(rng.random(count) < 0.42, 2, 1)
+    strong = rng.random((count, subjects)).argsort(axis=1).argsort(axis=1) < strength_count[:, None]
+    alpha += strong * rng.uniform(0.8, 1.7, (count, subjects))
+    rows = np.arange(count)
+    weak_idx = rng.integers(0, subjects, count)
+    alpha[rows, weak_idx] *= rng.uniform(0.72, 0.92, count)
+
+    weights = rng.standard_gamma(alpha)
+    weights /= weights.sum(axis=1, keepdims=True)
+    raw_scores = (targets[:, None] * weights).astype(np.int64)
+    raw_scores = rebalance_score_matrix(raw_scores, targets, mins, maxs, rng)
+
+    noisy_scores = np.clip(raw_scores + rng.integers(-3, 4, (count, subjects)), mins, maxs)
+    return rebalance_score_matrix(noisy_scores, targets, mins, maxs, rng)
+
+
+def generate_cohort(count: int, seed: int | None = None, batch_size: int = GENERATE_BATCH_SIZE) -> Iterator[list[tuple]]:
+    # A private generator, so a seeded run never reseeds the module-level
+    # random that the rest of the worker shares.
+    rand = random.Random(seed)
+    rng = np.random.default_rng(seed) if load_numpy() is not None else None
+    names = iter_unique_names(count, rand)
+    for start in range(0, count, batch_size):
+        batch_names = [next(names) for _ in range(min(batch_size, count - start))]
+        if rng is None:
+            records = [generate_student_record(name, rand) for name in batch_names]
+            yield [(record["name"], *(record[code] for code in SUBJECT_CODES)) for record in records]
         else:
-            candidates = [i for i in range(len(adjusted)) if adjusted[i] > mins[i]]
-            if not candidates:
-                break
-            idx = random.choice(candidates)
-            adjusted[idx] -= 1
-            diff += 1
-        guard += 1
+            scores = generate_score_matrix(len(batch_names), rng)
+            yield list(zip(batch_names, *scores.T.tolist()))
+
+
+def bulk_load_students(batches: Iterable[list[tuple]], replace: bool = True) -> int:
+    db = get_db()
+    triggers = maintenance_trigger_sql()
+    placeholders = ", ".join("?" for _ in range(len(SUBJECT_CODES) + 1))
+    sql = f"INSERT OR IGNORE INTO students (name, {', '.join(SUBJECT_CODES)}) VALUES ({placeholders})"
 
-    return adjusted
+    # Row-level maintenance (aggregates, FTS, version, change log) and the rank
+    # and subject indexes are dropped for the load and rebuilt once at the end, all in one
+    # transaction. The change log restarts under a new epoch.
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        for name in triggers:
+            db.execute(f"DROP TRIGGER IF EXISTS {name}")
+        db.execute("DROP INDEX IF EXISTS idx_students_rank")
+        for code in SUBJECT_CODES:
+            db.execute(f"DROP INDEX IF EXISTS idx_students_{code}")
+        if replace:
+            db.execute("DELETE FROM students")
+        before = db.execute("SELECT COUNT(1) FROM students").fetchone()[0]
+        for rows in batches:
+            db.executemany(sql, rows)
+        inserted = db.execute("SELECT COUNT(1) FROM students").fetchone()[0] - before
+
+        db.execute(RANK_INDEX_SQL)
+        for index_sql in SUBJECT_INDEX_SQL.values():
+            db.execute(index_sql)
+        create_triggers(db, triggers)
+        rebuild_aggregates(db)
+        if name_index_available:
+            db.execute("INSERT INTO students_name_fts (students_name_fts) VALUES ('rebuild')")
+        db.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+        reset_change_log(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return inserted
 
 
-def generate_student_record(name: str) -> dict[str, Any]:
-    tier = sample_tier()
+def generate_student_record(name: str, rand: Any = random) -> dict[str, Any]:
+    tier = sample_tier(rand)
     low, high = tier["range"]
-    target_total = clamp(random.gauss(tier["mean"], tier["std"]), low, high)
+    target_total = clamp(rand.gauss(tier["mean"], tier["std"]), low, high)
 
     mins = tier["mins"]
     maxs = [SUBJECT_MAX[code] for code in SUBJECT_CODES]
 
     alpha = [3.3, 3.3, 3.1, 2.1, 1.9, 1.8]
-    strength_count = 2 if random.random() < 0.42 else 1
-    for idx in random.sample(range(len(SUBJECT_CODES)), k=strength_count):
-        alpha[idx] += random.uniform(0.8, 1.7)
+    strength_count = 2 if rand.random() < 0.42 else 1
+    for idx in rand.sample(range(len(SUBJECT_CODES)), k=strength_count):
+        alpha[idx] += rand.uniform(0.8, 1.7)
 
-    weak_idx = random.randrange(len(SUBJECT_CODES))
-    alpha[weak_idx] *= random.uniform(0.72, 0.92)
+    weak_idx = rand.randrange(len(SUBJECT_CODES))
+    alpha[weak_idx] *= rand.uniform(0.72, 0.92)
 
-    weights = weighted_dirichlet(alpha)
+    weights = weighted_dirichlet(alpha, rand)
     raw_scores = [int(target_total * w) for w in weights]
-    raw_scores = rebalance_scores(raw_scores, target_total, mins, maxs)
+    raw_scores = rebalance_scores(raw_scores, target_total, mins, maxs, rand)
 
     noisy_scores = [
-        clamp(raw_scores[i] + random.randint(-3, 3), mins[i], maxs[i])
+        clamp(raw_scores[i] + rand.randint(-3, 3), mins[i], maxs[i])
         for i in range(len(raw_scores))
     ]
-    final_scores = rebalance_scores(noisy_scores, target_total, mins, maxs)
+    final_scores = rebalance_scores(noisy_scores, target_total, mins, maxs, rand)
 
     record = {"name": name}
     for i, code in enumerate(SUBJECT_CODES):
@@ -244,11 +1252,13 @@ def seed_sample_data(count: int = 40, clear_existing: bool = True) -> int:
     return len(records)
 
 
-def ensure_seeded() -> None:
+def ensure_seeded() -> bool:
     db = get_db()
-    count = db.execute("SELECT COUNT(1) FROM students").fetchone()[0]
+    count = db.execute("SELECT n FROM stats_moments WHERE id = 1").fetchone()[0]
     if count == 0:
         seed_sample_data(40, clear_existing=False)
+        return True
+    return False
 
 
 def row_to_dict(row: sqlite3.Row) -> dict[str, Any]:
@@ -265,209 +1275,2578 @@ def row_to_dict(row: sqlite3.Row) -> dict[str, Any]:
     }
 
 
-def fetch_students(
+def sort_key_columns(sort: str) -> list[str]:
+    return RANK_KEY_COLUMNS if sort == "total" else [sort, "total"]
+
+
+def order_sql(sort: str, descending: bool = True) -> str:
+    if sort == "total":
+        return RANK_ORDER if descending else "total ASC, chinese ASC, math ASC, english ASC, id DESC"
+    direction = "DESC" if descending else "ASC"
+    return f"{sort} {direction}, total {direction}, id {direction}"
+
+
+def student_query(
     keyword: str = "",
     min_total: int = 0,
     max_total: int = TOTAL_MAX,
     limit: int | None = None,
-) -> list[dict[str, Any]]:
-    db = get_db()
-    sql = f"""
-    SELECT
-        id,
-        name,
-        chinese,
-        math,
-        english,
-        physics,
-        chemistry,
-        biology,
-        {TOTAL_EXPR} AS total
-    FROM students
-    WHERE {TOTAL_EXPR} BETWEEN ? AND ?
-    """
+    columns: str = STUDENT_COLUMNS,
+    after: list[int] | None = None,
+    ordered: bool = True,
+    id_range: tuple[int, int] | None = None,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+    sort: str = "total",
+    descending: bool = True,
+    index: str | None = None,
+) -> tuple[str, list[Any]]:
+    if after is not None and sort == "total":
+        # Rows after the cursor can never have a higher total, so the cursor also
+        # tightens the index range; the row-value test then skips the tied rows.
+        if descending:
+            max_total = min(max_total, after[0])
+        else:
+            min_total = max(min_total, after[0])
+
+    indexed_by = f" INDEXED BY {index}" if index else ""
+    sql = f"SELECT {columns} FROM students{indexed_by} WHERE total BETWEEN ? AND ?"
     params: list[Any] = [min_total, max_total]
 
+    # Subject codes come from SUBJECT_CODES only; the bounds are parameters.
+    for code, low, high in ranges:
+        sql += f" AND {code} BETWEEN ? AND ?"
+        params.extend((low, high))
+
     if keyword:
-        sql += " AND name LIKE ?"
+        sql += name_filter_sql(keyword)
         params.append(f"%{keyword}%")
 
-    sql += " ORDER BY total DESC, chinese DESC, math DESC, english DESC, id ASC"
+    if after is not None:
+        key_columns = sort_key_columns(sort)
+        sort_key = ", ".join(key_columns)
+        placeholders = ", ".join("?" for _ in key_columns)
+        if sort == "total":
+            beyond, id_beyond = ("<", ">") if descending else (">", "<")
+            sql += (
+                f" AND (({sort_key}) {beyond} ({placeholders})"
+                f" OR (({sort_key}) = ({placeholders}) AND id {id_beyond} ?))"
+            )
+            params.extend(after[:-1] + after)
+        else:
+            sql += f" AND ({sort_key}, id) {'<' if descending else '>'} ({placeholders}, ?)"
+            params.extend(after)
+
+    if id_range is not None:
+        sql += " AND id BETWEEN ? AND ?"
+        params.extend(id_range)
+
+    if ordered:
+        sql += f" ORDER BY {order_sql(sort, descending)}"
 
     if limit is not None:
         sql += " LIMIT ?"
         params.append(limit)
 
-    rows = db.execute(sql, params).fetchall()
-    return [row_to_dict(row) for row in rows]
+    return sql, params
 
 
-def parse_int(value: Any, default: int) -> int:
-    try:
-        return int(value)
-    except (TypeError, ValueError):
-        return default
+@dataclass
+class QueryPlan:
+    index: str | None = None
+    estimated_rows: int | None = None
+    candidates: list[dict[str, Any]] = field(default_factory=list)
 
 
-def validate_score(subject: str, score: Any) -> int:
-    if subject not in SUBJECT_MAX:
-        raise ValueError(f"未知学科：{subject}")
-    try:
-        val = int(score)
-    except (TypeError, ValueError) as exc:
-        raise ValueError(f"{SUBJECT_LABELS[subject]}成绩必须是整数") from exc
+def index_for(column: str) -> str:
+    return "idx_students_rank" if column == "total" else f"idx_students_{column}"
 
-    max_score = SUBJECT_MAX[subject]
-    if val < 0 or val > max_score:
-        raise ValueError(f"{SUBJECT_LABELS[subject]}成绩范围应为 0-{max_score}")
-    return val
 
+def plan_student_query(
+    keyword: str,
+    min_total: int,
+    max_total: int,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+    sort: str = "total",
+    descending: bool = True,
+    limit: int | None = None,
+    ordered: bool = True,
+) -> QueryPlan:
+    # SQLite has no statistics on the score columns, so the index is chosen
+    # here from the exact per-score counts behind the rank index, assuming
+    # the filters are independent. The default ranking is left to SQLite.
+    if uses_name_index(keyword) or (not ranges and sort == "total" and descending):
+        return QueryPlan()
+    trees = current_rank_index().refresh(get_db())
+    n = trees["total"].total
+    if n == 0:
+        return QueryPlan(estimated_rows=0)
 
-def normalize_subject(subject: str) -> str:
-    if subject in SUBJECT_CODES:
+    def matching(column: str, low: int, high: int) -> int:
+        tree = trees[column]
+        return tree.prefix(min(high, tree.size - 1)) - (tree.prefix(low - 1) if low > 0 else 0)
+
+    filters = [("total", min_total, max_total)] if min_total > 0 or max_total < TOTAL_MAX else []
+    rows = {column: matching(column, low, high) for column, low, high in filters + list(ranges)}
+    estimated = n * math.prod(count / n for count in rows.values())
+    sort_cost = estimated * math.log2(estimated + 2) if ordered else 0.0
+
+    def walk_cost(column: str, scanned: int) -> float:
+        if ordered and column == sort and limit is not None:
+            # Walks in output order, so a limit stops it early.
+            scanned = min(scanned, limit * scanned / max(estimated, 1))
+        lookups = scanned if column == "total" else scanned * INDEX_LOOKUP_COST
+        return lookups + (0.0 if ordered and column == sort else sort_cost)
+
+    # index None leaves it to SQLite, which scans the covering rank index.
+    candidates = [{"index": None, "rows": n, "cost": round(walk_cost("total", n) if sort == "total" else n + sort_cost, 1)}]
+    for column, scanned in rows.items():
+        candidates.append({"index": index_for(column), "rows": scanned, "cost": round(walk_cost(column, scanned), 1)})
+    if ordered and sort not in rows:
+        candidates.append({"index": index_for(sort), "rows": n, "cost": round(walk_cost(sort, n), 1)})
+
+    best = min(candidates, key=lambda candidate: candidate["cost"])
+    return QueryPlan(best["index"], round(estimated), candidates)
+
+
+def run_student_query(sql: str, params: list[Any], plan: QueryPlan | None = None) -> list[tuple[Any, ...]]:
+    db = get_db()
+    cursor = db.cursor()
+    cursor.row_factory = None
+    started = time.perf_counter()
+    rows = cursor.execute(sql, params).fetchall()
+    explain = g.get("explain")
+    if explain is not None:
+        plan = plan or QueryPlan()
+        explain.append(
+            {
+                "sql": " ".join(sql.split()),
+                "params": params,
+                "index": plan.index,
+                "estimatedRows": plan.estimated_rows,
+                "candidates": plan.candidates,
+                "rows": len(rows),
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+                "queryPlan": [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()],
+            }
+        )
+    return rows
+
+
+def fetch_students(
+    keyword: str = "",
+    min_total: int = 0,
+    max_total: int = TOTAL_MAX,
+    limit: int | None = None,
+    after: list[int] | None = None,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+    sort: str = "total",
+    descending: bool = True,
+) -> list[dict[str, Any]]:
+    rows = fetch_student_rows(
+        keyword=keyword,
+        min_total=min_total,
+        max_total=max_total,
+        limit=limit,
+        after=after,
+        ranges=ranges,
+        sort=sort,
+        descending=descending,
+    )
+    return [tuple_to_student(row) for row in rows]
+
+
+def fetch_student_rows(
+    keyword: str = "",
+    min_total: int = 0,
+    max_total: int = TOTAL_MAX,
+    limit: int | None = None,
+    after: list[int] | None = None,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+    sort: str = "total",
+    descending: bool = True,
+) -> list[tuple[Any, ...]]:
+    if not keyword and after is None and not ranges and sort == "total" and descending:
+        # Only reuse an existing column file; a short list is not worth building one.
+        columns = current_column_store().view(get_db(), build=False)
+        if columns is not None:
+            return columns.between(min_total, max_total).rows(0, limit)
+
+    plan = plan_student_query(keyword, min_total, max_total, ranges, sort, descending, limit)
+    sql, params = student_query(
+        keyword=keyword,
+        min_total=min_total,
+        max_total=max_total,
+        limit=limit,
+        after=after,
+        ranges=ranges,
+        sort=sort,
+        descending=descending,
+        index=plan.index,
+    )
+    return run_student_query(sql, params, plan)
+
+
+def rows_to_columns(rows: list[tuple[Any, ...]]) -> dict[str, list[Any]]:
+    columns = zip(*rows) if rows else [() for _ in STUDENT_FIELDS]
+    return {field: list(values) for field, values in zip(STUDENT_FIELDS, columns)}
+
+
+def encode_cursor(student: dict[str, Any], sort: str = "total") -> str:
+    key = [student[column] for column in sort_key_columns(sort)] + [student["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str = "total") -> list[int]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("无效的分页游标") from exc
+    if (
+        not isinstance(key, list)
+        or len(key) != len(sort_key_columns(sort)) + 1
+        or not all(isinstance(value, int) and not isinstance(value, bool) for value in key)
+    ):
+        raise ValueError("无效的分页游标")
+    return key
+
+
+def fetch_student_page(
+    keyword: str = "",
+    min_total: int = 0,
+    max_total: int = TOTAL_MAX,
+    page_size: int = 100,
+    cursor: str | None = None,
+    columnar: bool = False,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+    sort: str = "total",
+    descending: bool = True,
+) -> dict[str, Any]:
+    after = decode_cursor(cursor, sort) if cursor else None
+    rows = fetch_student_rows(
+        keyword=keyword,
+        min_total=min_total,
+        max_total=max_total,
+        limit=page_size + 1,
+        after=after,
+        ranges=ranges,
+        sort=sort,
+        descending=descending,
+    )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    page: dict[str, Any] = {
+        "students": rows_to_columns(rows) if columnar else [tuple_to_student(row) for row in rows],
+        "next": encode_cursor(tuple_to_student(rows[-1]), sort) if has_more else None,
+    }
+    if columnar:
+        page["format"] = "columns"
+    return page
+
+
+def count_students(
+    keyword: str = "",
+    min_total: int = 0,
+    max_total: int = TOTAL_MAX,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+) -> int:
+    db = get_db()
+    if keyword or ranges:
+        plan = plan_student_query(keyword, min_total, max_total, ranges, ordered=False)
+        sql, params = student_query(
+            keyword=keyword,
+            min_total=min_total,
+            max_total=max_total,
+            columns="COUNT(1)",
+            ordered=False,
+            ranges=ranges,
+            index=plan.index,
+        )
+        return run_student_query(sql, params, plan)[0][0]
+    if min_total <= 0 and max_total >= TOTAL_MAX:
+        return db.execute("SELECT n FROM stats_moments WHERE id = 1").fetchone()[0]
+    return db.execute(
+        "SELECT COALESCE(SUM(count), 0) FROM stats_total_counts WHERE total BETWEEN ? AND ?",
+        (min_total, max_total),
+    ).fetchone()[0]
+
+
+def parse_int(value: Any, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_filter(source: Any) -> tuple[str, int, int]:
+    keyword = str(source.get("keyword") or "").strip()
+    min_total = clamp(parse_int(source.get("min_total"), 0), 0, TOTAL_MAX)
+    max_total = clamp(parse_int(source.get("max_total"), TOTAL_MAX), 0, TOTAL_MAX)
+    if min_total > max_total:
+        min_total, max_total = max_total, min_total
+    return keyword, min_total, max_total
+
+
+def parse_subject_ranges(source: Any) -> tuple[tuple[str, int, int], ...]:
+    ranges = []
+    for code in SUBJECT_CODES:
+        low_arg, high_arg = source.get(f"{code}_min"), source.get(f"{code}_max")
+        if low_arg in (None, "") and high_arg in (None, ""):
+            continue
+        low = clamp(parse_int(low_arg, 0), 0, SUBJECT_MAX[code])
+        high = clamp(parse_int(high_arg, SUBJECT_MAX[code]), 0, SUBJECT_MAX[code])
+        if low > high:
+            low, high = high, low
+        if low > 0 or high < SUBJECT_MAX[code]:
+            ranges.append((code, low, high))
+    return tuple(ranges)
+
+
+def parse_sort(source: Any) -> tuple[str, bool]:
+    sort = parse_rank_subject(source.get("sort"))
+    order = str(source.get("order") or "desc").strip().lower()
+    if order not in ("asc", "desc"):
+        raise ValueError("order 必须为 asc 或 desc")
+    return sort, order == "desc"
+
+
+def validate_score(subject: str, score: Any) -> int:
+    if subject not in SUBJECT_MAX:
+        raise ValueError(f"未知学科：{subject}")
+    try:
+        val = int(score)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"{SUBJECT_LABELS[subject]}成绩必须是整数") from exc
+
+    max_score = SUBJECT_MAX[subject]
+    if val < 0 or val > max_score:
+        raise ValueError(f"{SUBJECT_LABELS[subject]}成绩范围应为 0-{max_score}")
+    return val
+
+
+def normalize_subject(subject: str) -> str:
+    if subject in SUBJECT_CODES:
         return subject
     if subject in LABEL_TO_CODE:
         return LABEL_TO_CODE[subject]
     raise ValueError("无效学科，请使用语文/数学/英语/物理/化学/生物")
 
 
-def parse_student_payload(payload: dict[str, Any], require_all: bool = True) -> dict[str, Any]:
-    if not isinstance(payload, dict):
-        raise ValueError("请求体必须是 JSON 对象")
+def parse_student_payload(payload: dict[str, Any], require_all: bool = True) -> dict[str, Any]:
+    if not isinstance(payload, dict):
+        raise ValueError("请求体必须是 JSON 对象")
+
+    name = str(payload.get("name", "")).strip()
+    if not name:
+        raise ValueError("姓名不能为空")
+
+    cleaned: dict[str, Any] = {"name": name}
+    for subject in SUBJECT_CODES:
+        if require_all and subject not in payload:
+            raise ValueError(f"缺少学科字段：{subject}")
+        if subject in payload:
+            cleaned[subject] = validate_score(subject, payload[subject])
+
+    if require_all and any(subject not in cleaned for subject in SUBJECT_CODES):
+        raise ValueError("学科字段不完整")
+
+    return cleaned
+
+
+@dataclass
+class ScoreAggregate:
+    count: int = 0
+    sums: list[int] = field(default_factory=lambda: [0] * len(SUBJECT_CODES))
+    # Only the upper triangle (i <= j) of the cross-product matrix is kept.
+    products: list[list[int]] = field(
+        default_factory=lambda: [[0] * len(SUBJECT_CODES) for _ in SUBJECT_CODES]
+    )
+    total_counts: list[int] = field(default_factory=lambda: [0] * (TOTAL_MAX + 1))
+    score_counts: list[list[int]] = field(
+        default_factory=lambda: [[0] * (SUBJECT_MAX[code] + 1) for code in SUBJECT_CODES]
+    )
+
+    def moments(self) -> list[int]:
+        return (
+            [self.count]
+            + list(self.sums)
+            + [self.products[i][j] for i, j in SUBJECT_PAIRS]
+        )
+
+    @classmethod
+    def from_moments(
+        cls,
+        moments: list[int],
+        total_counts: dict[int, int],
+        score_counts: Iterable[tuple[str, int, int]] = (),
+    ) -> "ScoreAggregate":
+        agg = cls()
+        agg.count = moments[0]
+        agg.sums = list(moments[1 : 1 + len(SUBJECT_CODES)])
+        for (i, j), value in zip(SUBJECT_PAIRS, moments[1 + len(SUBJECT_CODES) :]):
+            agg.products[i][j] = value
+        for total, count in total_counts.items():
+            agg.total_counts[total] = count
+        for subject, score, count in score_counts:
+            agg.score_counts[SUBJECT_CODES.index(subject)][score] = count
+        return agg
+
+    def correlation(self, i: int, j: int) -> float:
+        n = self.count
+        if n < 2:
+            return 0.0
+        var_i = n * self.products[i][i] - self.sums[i] ** 2
+        var_j = n * self.products[j][j] - self.sums[j] ** 2
+        if var_i == 0 or var_j == 0:
+            return 0.0
+        cov = n * self.products[min(i, j)][max(i, j)] - self.sums[i] * self.sums[j]
+        return round(cov / (var_i ** 0.5 * var_j ** 0.5), 4)
+
+    def count_between(self, low: int, high: int) -> int:
+        return sum(self.total_counts[max(0, low) : min(TOTAL_MAX, high) + 1])
+
+    def merge(self, other: ScoreAggregate) -> None:
+        # Every field is a plain sum over students, so shards combine exactly.
+        self.count += other.count
+        self.sums = list(map(add, self.sums, other.sums))
+        for i, j in SUBJECT_PAIRS:
+            self.products[i][j] += other.products[i][j]
+        self.total_counts = list(map(add, self.total_counts, other.total_counts))
+        self.score_counts = [list(map(add, mine, theirs)) for mine, theirs in zip(self.score_counts, other.score_counts)]
+
+
+class NameColumn:
+    def __init__(self, offsets: memoryview, blob: memoryview) -> None:
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int | slice) -> str | NameColumn:
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self))
+            return NameColumn(self.offsets[start : max(start, stop) + 1], self.blob)
+        return str(self.blob[self.offsets[index] : self.offsets[index + 1]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        offsets, blob = self.offsets, self.blob
+        for i in range(len(self)):
+            yield str(blob[offsets[i] : offsets[i + 1]], "utf-8")
+
+    def search(self, keyword: str) -> list[int]:
+        # bytes.lower() folds ASCII letters only, which is what LIKE does.
+        base = self.offsets[0]
+        haystack = bytes(self.blob[base : self.offsets[-1]]).lower()
+        needle = keyword.encode("utf-8").lower()
+        matches = []
+        position = haystack.find(needle)
+        while position >= 0:
+            idx = bisect_right(self.offsets, base + position) - 1
+            end = self.offsets[idx + 1] - base
+            if position + len(needle) <= end:
+                matches.append(idx)
+            # Any later hit starting in this name is either a repeat or straddles into the next one.
+            position = haystack.find(needle, max(end, position + 1))
+        return matches
+
+
+@dataclass
+class ScoreColumns:
+    ids: Any
+    names: Any
+    scores: list[Any]
+    totals: Any
+
+    @property
+    def count(self) -> int:
+        return len(self.totals)
+
+    def span(self, min_total: int, max_total: int) -> tuple[int, int]:
+        # Rows are in rank order, so a total range is one contiguous slice.
+        start = bisect_left(self.totals, -max_total, key=lambda total: -total)
+        stop = bisect_right(self.totals, -min_total, key=lambda total: -total)
+        return start, stop
+
+    def between(self, min_total: int, max_total: int) -> ScoreColumns:
+        return self.slice(*self.span(min_total, max_total))
+
+    def slice(self, start: int, stop: int) -> ScoreColumns:
+        return ScoreColumns(
+            ids=self.ids[start:stop],
+            names=self.names[start:stop],
+            scores=[column[start:stop] for column in self.scores],
+            totals=self.totals[start:stop],
+        )
+
+    def matching(self, keyword: str) -> ScoreColumns:
+        # Same result as name LIKE '%keyword%': only ASCII letters fold case.
+        if isinstance(self.names, NameColumn):
+            keep = self.names.search(keyword)
+        else:
+            needle = keyword.translate(ASCII_LOWER)
+            keep = [idx for idx, name in enumerate(self.names) if needle in name.translate(ASCII_LOWER)]
+        return self.take(keep)
+
+    def within(self, ranges: tuple[tuple[str, int, int], ...], with_names: bool = True) -> ScoreColumns:
+        positions = [(SUBJECT_CODES.index(code), low, high) for code, low, high in ranges]
+        if load_numpy() is None:
+            keep = [
+                idx
+                for idx in range(self.count)
+                if all(low <= self.scores[position][idx] <= high for position, low, high in positions)
+            ]
+            return self.take(keep, with_names)
+
+        mask = np.ones(self.count, dtype=bool)
+        for position, low, high in positions:
+            column = np.asarray(self.scores[position])
+            mask &= (column >= low) & (column <= high)
+        keep = np.flatnonzero(mask)
+        return ScoreColumns(
+            ids=np.asarray(self.ids)[keep].tolist() if with_names and len(self.ids) else [],
+            names=[self.names[idx] for idx in keep.tolist()] if with_names and len(self.names) else [],
+            scores=[array("B", np.asarray(column)[keep].tobytes()) for column in self.scores],
+            totals=array("H", np.asarray(self.totals)[keep].tobytes()),
+        )
+
+    def take(self, keep: list[int], with_names: bool = True) -> ScoreColumns:
+        return ScoreColumns(
+            ids=[self.ids[idx] for idx in keep] if with_names else [],
+            names=[self.names[idx] for idx in keep] if with_names else [],
+            scores=[array("B", [column[idx] for idx in keep]) for column in self.scores],
+            totals=array("H", [self.totals[idx] for idx in keep]),
+        )
+
+    def rows(self, start: int = 0, stop: int | None = None) -> list[tuple[Any, ...]]:
+        stop = self.count if stop is None else min(self.count, stop)
+        return list(
+            zip(
+                self.ids[start:stop],
+                self.names[start:stop],
+                *(column[start:stop] for column in self.scores),
+                self.totals[start:stop],
+            )
+        )
+
+    def students(self, start: int = 0, stop: int | None = None) -> list[dict[str, Any]]:
+        students = []
+        for idx in range(start, min(self.count, self.count if stop is None else stop)):
+            student: dict[str, Any] = {"id": self.ids[idx], "name": self.names[idx]}
+            for code, column in zip(SUBJECT_CODES, self.scores):
+                student[code] = column[idx]
+            student["total"] = self.totals[idx]
+            students.append(student)
+        return students
+
+
+class ColumnStore:
+    # One file per data version, in rank order:
+    #   header | ids int64 | totals uint16 | name offsets uint32 (n + 1) | six uint8 subjects | names utf-8
+    # Every worker maps the same file, so the columns live once in the page cache.
+    def __init__(self, directory: str, db_path: str = DB_PATH) -> None:
+        self.directory = directory
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.version: str | None = None
+        self.columns: ScoreColumns | None = None
+        self.builder: int | None = None
+        self.built_at = float("-inf")
+
+    def path(self, version: str) -> str:
+        return os.path.join(self.directory, f"scores-{version}.cols")
+
+    def view(self, db: sqlite3.Connection, build: bool = True, wait: bool = False) -> ScoreColumns | None:
+        if not COLUMN_STORE_ENABLED:
+            return None
+        version = current_data_version(db)
+        with self.lock:
+            if version == self.version:
+                return self.columns
+        columns = self.open(version)
+        if columns is None and build:
+            if not wait:
+                # Rebuilding inside the request would make the first read after
+                # every write the slowest one; SQLite serves until the file lands.
+                self.build_in_background(version)
+                return None
+            columns = self.build(version)
+        if columns is not None:
+            with self.lock:
+                self.version, self.columns = version, columns
+        return columns
+
+    def build_in_background(self, version: str) -> None:
+        with self.lock:
+            # builder holds a pid: a flag inherited across a fork is not ours.
+            if self.builder == os.getpid() or time.monotonic() - self.built_at < COLUMN_STORE_REBUILD_SECONDS:
+                return
+            self.builder = os.getpid()
+        threading.Thread(target=self.build_and_swap, args=(version,), name="column-store-build", daemon=True).start()
+
+    def build_and_swap(self, version: str) -> None:
+        try:
+            columns = self.build(version)
+        except (OSError, sqlite3.Error):
+            columns = None
+        with self.lock:
+            if columns is not None:
+                self.version, self.columns = version, columns
+            self.builder = None
+            self.built_at = time.monotonic()
+
+    def open(self, version: str) -> ScoreColumns | None:
+        try:
+            with open(self.path(version), "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        magic, count, name_bytes, stored_version = COLUMN_FILE_HEADER.unpack_from(mapped)
+        if magic != COLUMN_FILE_MAGIC or stored_version.rstrip(b"\0").decode("ascii") != version:
+            return None
+
+        buffer = memoryview(mapped)
+        offset = COLUMN_FILE_HEADER.size
+
+        def take(size: int, fmt: str) -> memoryview:
+            nonlocal offset
+            view = buffer[offset : offset + size].cast(fmt)
+            offset += size
+            return view
+
+        ids = take(8 * count, "q")
+        totals = take(2 * count, "H")
+        name_offsets = take(4 * (count + 1), "I")
+        scores = [take(count, "B") for _ in SUBJECT_CODES]
+        names = NameColumn(name_offsets, take(name_bytes, "B"))
+        return ScoreColumns(ids=ids, names=names, scores=scores, totals=totals)
+
+    def build(self, version: str) -> ScoreColumns | None:
+        lock_path = os.path.join(self.directory, "build.lock")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if os.path.exists(lock_path) and time.time() - os.path.getmtime(lock_path) > COLUMN_STORE_LOCK_SECONDS:
+                os.remove(lock_path)
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError:
+            # Another worker is building (or the disk is read-only); read from SQLite meanwhile.
+            return None
+        try:
+            self.write(version)
+        finally:
+            os.close(lock_fd)
+            os.remove(lock_path)
+        for name in os.listdir(self.directory):
+            if name.startswith("scores-") and name != os.path.basename(self.path(version)):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        return self.open(version)
+
+    def write(self, version: str) -> None:
+        ids, totals, name_offsets = array("q"), array("H"), array("I", [0])
+        scores = [array("B") for _ in SUBJECT_CODES]
+        names = bytearray()
+
+        # A separate connection keeps the read transaction off the request's one.
+        db = open_connection(self.db_path)
+        try:
+            db.execute("BEGIN")
+            if current_data_version(db) != version:
+                return
+            sql, params = student_query()
+            cursor = db.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(GENERATE_BATCH_SIZE)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                ids.extend(columns[0])
+                encoded = [name.encode("utf-8") for name in columns[1]]
+                base = len(names)
+                names += b"".join(encoded)
+                name_offsets.extend(base + end for end in accumulate(map(len, encoded)))
+                for column, values in zip(scores, columns[2:-1]):
+                    column.extend(values)
+                totals.extend(columns[-1])
+        finally:
+            db.close()
+
+        path = self.path(version)
+        with open(f"{path}.tmp", "wb") as handle:
+            handle.write(COLUMN_FILE_HEADER.pack(COLUMN_FILE_MAGIC, len(totals), len(names), version.encode("ascii")))
+            for column in (ids, totals, name_offsets, *scores):
+                column.tofile(handle)
+            handle.write(names)
+        os.replace(f"{path}.tmp", path)
+
+
+column_stores: dict[str, ColumnStore] = {}
+
+
+def per_database(registry: dict[str, Any], factory: Callable[[str], Any]) -> Any:
+    path = database_path()
+    instance = registry.get(path)
+    if instance is None:
+        instance = registry.setdefault(path, factory(path))
+    return instance
+
+
+def current_column_store() -> ColumnStore:
+    def open_store(path: str) -> ColumnStore:
+        if path == DB_PATH:
+            return ColumnStore(COLUMN_STORE_DIR, path)
+        exam_id = os.path.splitext(os.path.basename(path))[0]
+        return ColumnStore(os.path.join(COLUMN_STORE_DIR, "exams", exam_id), path)
+
+    return per_database(column_stores, open_store)
+
+
+def fetch_score_columns(
+    keyword: str = "",
+    min_total: int = 0,
+    max_total: int = TOTAL_MAX,
+    with_names: bool = True,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+) -> ScoreColumns:
+    if not keyword:
+        columns = current_column_store().view(get_db())
+        if columns is not None:
+            columns = columns.between(min_total, max_total)
+            return columns.within(ranges, with_names) if ranges else columns
+
+    score_columns = ", ".join(SUBJECT_CODES + ["total"])
+    plan = plan_student_query(keyword, min_total, max_total, ranges)
+    sql, params = student_query(
+        keyword=keyword,
+        min_total=min_total,
+        max_total=max_total,
+        columns=f"id, name, {score_columns}" if with_names else score_columns,
+        ranges=ranges,
+        index=plan.index,
+    )
+    return rows_to_score_columns(run_student_query(sql, params, plan), with_names)
+
+
+def rows_to_score_columns(rows: list[tuple[Any, ...]], with_names: bool) -> ScoreColumns:
+    if not rows:
+        return ScoreColumns([], [], [array("B") for _ in SUBJECT_CODES], array("H"))
+
+    columns = list(zip(*rows))
+    ids, names = (list(columns.pop(0)), list(columns.pop(0))) if with_names else ([], [])
+    return ScoreColumns(
+        ids=ids,
+        names=names,
+        scores=[array("B", column) for column in columns[:-1]],
+        totals=array("H", columns[-1]),
+    )
+
+
+def aggregate_columns(columns: ScoreColumns) -> ScoreAggregate:
+    agg = ScoreAggregate()
+    agg.count = columns.count
+    if not agg.count:
+        return agg
+
+    if load_numpy() is not None:
+        matrix = np.vstack([np.frombuffer(column, dtype=np.uint8) for column in columns.scores]).astype(np.int64)
+        agg.sums = matrix.sum(axis=1).tolist()
+        agg.products = (matrix @ matrix.T).tolist()
+        agg.total_counts = np.bincount(
+            np.frombuffer(columns.totals, dtype=np.uint16), minlength=TOTAL_MAX + 1
+        ).tolist()
+        agg.score_counts = [
+            np.bincount(row, minlength=SUBJECT_MAX[code] + 1).tolist() for code, row in zip(SUBJECT_CODES, matrix)
+        ]
+        return agg
+
+    agg.sums = [sum(column) for column in columns.scores]
+    for i, j in SUBJECT_PAIRS:
+        agg.products[i][j] = sum(map(mul, columns.scores[i], columns.scores[j]))
+    for total, count in Counter(columns.totals).items():
+        agg.total_counts[total] = count
+    for counts, column in zip(agg.score_counts, columns.scores):
+        for score, count in Counter(column).items():
+            counts[score] = count
+    return agg
+
+
+def load_aggregate(db: sqlite3.Connection) -> ScoreAggregate:
+    moments = db.execute(f"SELECT {', '.join(MOMENT_COLUMNS)} FROM stats_moments WHERE id = 1").fetchone()
+    total_counts = db.execute("SELECT total, count FROM stats_total_counts WHERE count > 0").fetchall()
+    score_counts = db.execute("SELECT subject, score, count FROM stats_score_counts WHERE count > 0").fetchall()
+    return ScoreAggregate.from_moments(list(moments), {row[0]: row[1] for row in total_counts}, score_counts)
+
+
+partition_connections: dict[str, sqlite3.Connection] = {}
+partition_columns: dict[str, tuple[str, ScoreColumns]] = {}
+
+
+def partial_aggregate(
+    path: str,
+    version: str,
+    keyword: str,
+    min_total: int,
+    max_total: int,
+    id_range: tuple[int, int],
+) -> ScoreAggregate | None:
+    # Runs in a pool process: a plain read-only connection, no request state.
+    db = partition_connections.get(path)
+    if db is None:
+        db = partition_connections[path] = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        db.execute(f"PRAGMA mmap_size = {DB_MMAP_BYTES}")
+    db.execute("BEGIN")
+    try:
+        # Partitions read in separate transactions; a write in between would
+        # mix two versions, so the caller then falls back to one process.
+        if current_data_version(db) != version:
+            return None
+        sql, params = student_query(
+            keyword=keyword,
+            min_total=min_total,
+            max_total=max_total,
+            columns=", ".join(SUBJECT_CODES + ["total"]),
+            ordered=False,
+            id_range=id_range,
+        )
+        rows = db.execute(sql, params).fetchall()
+    finally:
+        db.rollback()
+    return aggregate_columns(rows_to_score_columns(rows, with_names=False))
+
+
+def partial_column_aggregate(directory: str, version: str, start: int, stop: int) -> ScoreAggregate | None:
+    # Runs in a pool process: maps the same column file the caller sliced.
+    # Only the newest version is kept mapped; a file already replaced by a
+    # later build is gone, and the caller then falls back to one process.
+    cached = partition_columns.get(directory)
+    if cached is None or cached[0] != version:
+        columns = ColumnStore(directory).open(version)
+        if columns is None:
+            return None
+        cached = partition_columns[directory] = (version, columns)
+    return aggregate_columns(cached[1].slice(start, stop))
+
+
+class PartitionPool:
+    # Created on first use in each process, so a pool is never inherited
+    # across a fork (gunicorn --preload). Pool processes come from a fork
+    # server rather than forking the caller: the server worker has request,
+    # writer and column-store threads, and a forked child could inherit a lock
+    # one of them held.
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pid: int | None = None
+        self.executor: ProcessPoolExecutor | None = None
+
+    def map(self, fn: Callable[..., Any], *iterables: Iterable[Any]) -> list[Any] | None:
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(method)
+                )
+                self.pid = os.getpid()
+            executor = self.executor
+        try:
+            return list(executor.map(fn, *iterables))
+        except BrokenProcessPool:
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = None
+            return None
+
+
+partition_pool = PartitionPool(PARALLEL_STATS_WORKERS)
+
+
+def parallel_aggregate(keyword: str, min_total: int, max_total: int) -> ScoreAggregate | None:
+    # The name index already answers long keywords in one short pass; every
+    # other filter is split once the rows it has to aggregate are many.
+    if PARALLEL_STATS_WORKERS < 2 or uses_name_index(keyword):
+        return None
+    db = get_db()
+    if not keyword:
+        store = current_column_store()
+        if store.view(db) is not None:
+            with store.lock:
+                version, columns = store.version, store.columns
+            if version is not None and columns is not None:
+                return parallel_column_aggregate(store.directory, version, *columns.span(min_total, max_total))
+
+    if keyword:
+        # A keyword scan reads every row whatever it matches.
+        rows = db.execute("SELECT n FROM stats_moments WHERE id = 1").fetchone()[0]
+    else:
+        rows = db.execute(
+            "SELECT COALESCE(SUM(count), 0) FROM stats_total_counts WHERE total BETWEEN ? AND ?", (min_total, max_total)
+        ).fetchone()[0]
+    if rows < PARALLEL_STATS_MIN_ROWS:
+        return None
+
+    version = current_data_version(db)
+    low, high = db.execute("SELECT MIN(id), MAX(id) FROM students").fetchone()
+    step = -(-(high - low + 1) // PARALLEL_STATS_WORKERS)
+    ranges = [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+    return merge_partials(
+        partial_aggregate,
+        [(database_path(), version, keyword, min_total, max_total, id_range) for id_range in ranges],
+    )
+
+
+def parallel_column_aggregate(directory: str, version: str, start: int, stop: int) -> ScoreAggregate | None:
+    if stop - start < PARALLEL_STATS_MIN_ROWS:
+        return None
+    step = -(-(stop - start) // PARALLEL_STATS_WORKERS)
+    return merge_partials(
+        partial_column_aggregate,
+        [(directory, version, low, min(low + step, stop)) for low in range(start, stop, step)],
+    )
+
+
+def merge_partials(fn: Callable[..., ScoreAggregate | None], tasks: list[tuple[Any, ...]]) -> ScoreAggregate | None:
+    with metrics.phase("partitions"):
+        partials = partition_pool.map(fn, *zip(*tasks))
+    metrics.note("partitions", f"{len(tasks)} partitions")
+    if partials is None or any(partial is None for partial in partials):
+        return None
+
+    agg = ScoreAggregate()
+    for partial in partials:
+        agg.merge(partial)
+    return agg
+
+
+def aggregate_filtered(
+    keyword: str,
+    min_total: int,
+    max_total: int,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+) -> ScoreAggregate:
+    if not keyword and not ranges and min_total <= 0 and max_total >= TOTAL_MAX:
+        return load_aggregate(get_db())
+    # Subject ranges are index range scans already; partitions would each walk the whole range.
+    agg = parallel_aggregate(keyword, min_total, max_total) if not ranges else None
+    if agg is not None:
+        return agg
+    return aggregate_columns(
+        fetch_score_columns(keyword=keyword, min_total=min_total, max_total=max_total, with_names=False, ranges=ranges)
+    )
+
+
+def compute_aggregate_from_table(db: sqlite3.Connection) -> ScoreAggregate:
+    select = ", ".join(f"COALESCE(SUM({delta}), 0)" for delta in moment_deltas("students"))
+    moments = db.execute(f"SELECT {select} FROM students").fetchone()
+    total_counts = db.execute("SELECT total, COUNT(1) FROM students GROUP BY total").fetchall()
+    score_counts = db.execute(
+        " UNION ALL ".join(
+            f"SELECT '{code}', {code}, COUNT(1) FROM students GROUP BY {code}" for code in SUBJECT_CODES
+        )
+    ).fetchall()
+    return ScoreAggregate.from_moments(list(moments), {row[0]: row[1] for row in total_counts}, score_counts)
+
+
+def rebuild_aggregates(db: sqlite3.Connection) -> ScoreAggregate:
+    agg = compute_aggregate_from_table(db)
+    assignments = ", ".join(f"{column} = ?" for column in MOMENT_COLUMNS)
+    db.execute(f"UPDATE stats_moments SET {assignments} WHERE id = 1", agg.moments())
+    db.execute("DELETE FROM stats_total_counts")
+    db.executemany(
+        "INSERT INTO stats_total_counts (total, count) VALUES (?, ?)",
+        [(total, count) for total, count in enumerate(agg.total_counts) if count],
+    )
+    db.execute("DELETE FROM stats_score_counts")
+    db.executemany(
+        "INSERT INTO stats_score_counts (subject, score, count) VALUES (?, ?, ?)",
+        [
+            (code, score, count)
+            for code, counts in zip(SUBJECT_CODES, agg.score_counts)
+            for score, count in enumerate(counts)
+            if count
+        ],
+    )
+    return agg
+
+
+def check_aggregates(repair: bool = False) -> bool:
+    db = get_db()
+    stored = load_aggregate(db)
+    actual = compute_aggregate_from_table(db)
+    consistent = (
+        stored.moments() == actual.moments()
+        and stored.total_counts == actual.total_counts
+        and stored.score_counts == actual.score_counts
+    )
+    if not consistent and repair:
+        rebuild_aggregates(db)
+        db.commit()
+    return consistent
+
+
+class FenwickTree:
+    def __init__(self, counts: list[int]) -> None:
+        self.size = len(counts)
+        self.tree = [0] + list(counts)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+        self.total = self.prefix(self.size - 1)
+
+    def prefix(self, index: int) -> int:
+        # Number of entries with value <= index.
+        i = min(index, self.size - 1) + 1
+        result = 0
+        while i > 0:
+            result += self.tree[i]
+            i -= i & -i
+        return result
+
+    def kth(self, k: int) -> int:
+        # Smallest value whose prefix count reaches k (1-based).
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                position = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return position
+
+
+RANK_SUBJECTS = ("total", *SUBJECT_CODES)
+
+
+class RankIndex:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.version: str | None = None
+        self.trees: dict[str, FenwickTree] = {}
+
+    def refresh(self, db: sqlite3.Connection) -> dict[str, FenwickTree]:
+        # Triggers keep the count tables current on every write in any worker;
+        # the trees are rebuilt from them (O(score domain)) when the version moves.
+        version = current_data_version(db)
+        with self.lock:
+            if version != self.version:
+                agg = load_aggregate(db)
+                trees = {"total": FenwickTree(agg.total_counts)}
+                trees.update(zip(SUBJECT_CODES, map(FenwickTree, agg.score_counts)))
+                self.trees = trees
+                self.version = version
+            return self.trees
+
+    def position(self, subject: str, score: int) -> dict[str, Any]:
+        tree = self.trees[subject]
+        score = clamp(score, 0, tree.size - 1)
+        below = tree.prefix(score - 1) if score > 0 else 0
+        tied = tree.prefix(score) - below
+        higher = tree.total - below - tied
+        return {
+            "score": score,
+            "rank": higher + 1,
+            "tied": tied,
+            "atLeast": higher + tied,
+            "percentile": round((below + tied / 2) / tree.total * 100, 2) if tree.total else 0.0,
+        }
+
+    def nth(self, subject: str, n: int) -> int | None:
+        tree = self.trees[subject]
+        if n < 1 or n > tree.total:
+            return None
+        return tree.kth(tree.total - n + 1)
+
+
+rank_indexes: dict[str, RankIndex] = {}
+
+
+def current_rank_index() -> RankIndex:
+    return per_database(rank_indexes, lambda _: RankIndex())
+
+
+def parse_rank_subject(value: str | None) -> str:
+    subject = (value or "total").strip()
+    if subject in ("total", "总分"):
+        return "total"
+    return normalize_subject(subject)
+
+
+def empty_stats() -> dict[str, Any]:
+    return {
+        "count": 0,
+        "avgTotal": 0,
+        "maxTotal": 0,
+        "minTotal": 0,
+        "excellentRate": 0,
+        "qualifiedRate": 0,
+        "subjectAverages": [],
+        "segments": [],
+        "histogram": [],
+        "top10": [],
+        "scatter": [],
+        "subjectSeries": {},
+        "subjectBoxes": {},
+        "correlations": [],
+    }
+
+
+def score_at(counts: list[int], index: int) -> int:
+    seen = 0
+    for score, count in enumerate(counts):
+        seen += count
+        if seen > index:
+            return score
+    return len(counts) - 1
+
+
+def histogram_quantile(counts: list[int], n: int, q: float) -> float:
+    # Same linear interpolation as the sorted-array quantile the charts used.
+    position = (n - 1) * q
+    base = int(position)
+    rest = position - base
+    low = score_at(counts, base)
+    if rest and base + 1 < n:
+        return round(low + rest * (score_at(counts, base + 1) - low), 2)
+    return low
+
+
+def subject_boxes(agg: ScoreAggregate) -> dict[str, list[float]]:
+    boxes = {}
+    for code, counts in zip(SUBJECT_CODES, agg.score_counts):
+        present = [score for score, count in enumerate(counts) if count]
+        boxes[SUBJECT_LABELS[code]] = [
+            present[0],
+            histogram_quantile(counts, agg.count, 0.25),
+            histogram_quantile(counts, agg.count, 0.5),
+            histogram_quantile(counts, agg.count, 0.75),
+            present[-1],
+        ]
+    return boxes
+
+
+def scatter_points(columns: ScoreColumns) -> list[dict[str, Any]]:
+    math_scores = columns.scores[SUBJECT_CODES.index("math")]
+    english_scores = columns.scores[SUBJECT_CODES.index("english")]
+    return [
+        {"name": name, "math": math_score, "english": english_score, "total": total}
+        for name, math_score, english_score, total in zip(columns.names, math_scores, english_scores, columns.totals)
+    ]
+
+
+def binned_scatter(
+    keyword: str,
+    min_total: int,
+    max_total: int,
+    budget: int,
+    agg: ScoreAggregate,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+) -> list[dict[str, Any]]:
+    # SQLite groups the rows on a grid of about 16x the budget over the occupied
+    # range; neighbouring cells are then merged by the smallest factor that fits.
+    math_scores = [score for score, count in enumerate(agg.score_counts[SUBJECT_CODES.index("math")]) if count]
+    totals = [total for total, count in enumerate(agg.total_counts) if count]
+    side = math.sqrt(16 * budget)
+    math_step = max(1, int((math_scores[-1] - math_scores[0] + 1) / side))
+    total_step = max(1, int((totals[-1] - totals[0] + 1) / side))
+    plan = plan_student_query(keyword, min_total, max_total, ranges, ordered=False)
+    sql, params = student_query(
+        keyword=keyword,
+        min_total=min_total,
+        max_total=max_total,
+        columns=(
+            f"(math - {math_scores[0]}) / {math_step}, (total - {totals[0]}) / {total_step}, "
+            "COUNT(1), SUM(math), SUM(total), SUM(english)"
+        ),
+        ordered=False,
+        ranges=ranges,
+        index=plan.index,
+    )
+    grid = run_student_query(f"{sql} GROUP BY 1, 2", params, plan)
+
+    def merge(factor: int) -> dict[tuple[int, int], list[int]]:
+        cells: dict[tuple[int, int], list[int]] = {}
+        for x, y, *values in grid:
+            cell = cells.setdefault((x // factor, y // factor), [0, 0, 0, 0])
+            for i, value in enumerate(values):
+                cell[i] += value
+        return cells
+
+    def occupied(factor: int) -> int:
+        return len({(row[0] // factor, row[1] // factor) for row in grid})
+
+    low, high = 1, max(max(row[0], row[1]) for row in grid) + 1
+    while low < high:
+        mid = (low + high) // 2
+        if occupied(mid) <= budget:
+            high = mid
+        else:
+            low = mid + 1
+    cells = merge(low)
+    while len(cells) > budget:
+        low += 1
+        cells = merge(low)
+
+    return [
+        {
+            "math": round(math_sum / count, 1),
+            "total": round(total_sum / count, 1),
+            "english": round(english_sum / count, 1),
+            "count": count,
+        }
+        for count, math_sum, total_sum, english_sum in cells.values()
+    ]
+
+
+def render_stats(
+    agg: ScoreAggregate,
+    columns: ScoreColumns | None,
+    top10: list[dict[str, Any]],
+    scatter: list[dict[str, Any]] | None = None,
+) -> dict[str, Any]:
+    count = agg.count
+    if count == 0:
+        return empty_stats()
+
+    present = [total for total, n in enumerate(agg.total_counts) if n]
+    min_total, max_total = present[0], present[-1]
+
+    subject_averages = [
+        {
+            "code": code,
+            "label": SUBJECT_LABELS[code],
+            "avg": round(agg.sums[i] / count, 2),
+            "max": SUBJECT_MAX[code],
+        }
+        for i, code in enumerate(SUBJECT_CODES)
+    ]
+
+    segments = [
+        {"label": "350以下", "count": agg.count_between(0, 349)},
+        {"label": "350-449", "count": agg.count_between(350, 449)},
+        {"label": "450-549", "count": agg.count_between(450, 549)},
+        {"label": "550-649", "count": agg.count_between(550, 649)},
+        {"label": "650及以上", "count": agg.count_between(650, TOTAL_MAX)},
+    ]
+
+    step = 25
+    hist_start = max(0, (min_total // step) * step)
+    hist_end = min(TOTAL_MAX + step, ((max_total // step) + 2) * step)
+    histogram = []
+    for left in range(hist_start, hist_end, step):
+        right = left + step
+        if right >= hist_end:
+            count_in_bin = agg.count_between(left, right)
+        else:
+            count_in_bin = agg.count_between(left, right - 1)
+        histogram.append(
+            {
+                "label": f"{left}-{right - 1}",
+                "left": left,
+                "count": count_in_bin,
+            }
+        )
+
+    subject_series: dict[str, list[int]] = {}
+    if scatter is None:
+        scatter = scatter_points(columns) if columns is not None else []
+        if columns is not None and columns.count:
+            subject_series = {
+                SUBJECT_LABELS[code]: column.tolist() for code, column in zip(SUBJECT_CODES, columns.scores)
+            }
+
+    correlations = []
+    for i, (_, label_x, _) in enumerate(SUBJECT_META):
+        for j, (_, label_y, _) in enumerate(SUBJECT_META):
+            correlations.append({"x": label_x, "y": label_y, "value": agg.correlation(i, j)})
+
+    return {
+        "count": count,
+        "avgTotal": round(sum(agg.sums) / count, 2),
+        "maxTotal": max_total,
+        "minTotal": min_total,
+        "excellentRate": round(agg.count_between(600, TOTAL_MAX) * 100 / count, 2),
+        "qualifiedRate": round(agg.count_between(450, TOTAL_MAX) * 100 / count, 2),
+        "subjectAverages": subject_averages,
+        "segments": segments,
+        "histogram": histogram,
+        "top10": top10,
+        "scatter": scatter,
+        "subjectSeries": subject_series,
+        "subjectBoxes": subject_boxes(agg),
+        "correlations": correlations,
+    }
+
+
+def parse_operation(item: Any) -> dict[str, Any]:
+    if not isinstance(item, dict):
+        raise ValueError("操作必须是 JSON 对象")
+    op = str(item.get("op", "")).strip()
+    if op not in BATCH_OPERATION_TYPES:
+        raise ValueError("op 必须为 insert / delete / subject / update")
+    if op == "insert":
+        return {"op": op, "id": None, "fields": parse_student_payload(item, require_all=True)}
+    student_id = item.get("id")
+    if not isinstance(student_id, int) or isinstance(student_id, bool):
+        raise ValueError("id 必须是整数")
+
+    parsed: dict[str, Any] = {"op": op, "id": student_id}
+    if op == "subject":
+        subject = normalize_subject(str(item.get("subject", "")).strip())
+        parsed["subject"] = subject
+        parsed["score"] = validate_score(subject, item.get("score"))
+    elif op == "update":
+        parsed["fields"] = parse_student_payload(item, require_all=True)
+    return parsed
+
+
+def apply_operation(db: sqlite3.Connection, operation: dict[str, Any]) -> dict[str, Any]:
+    op = operation["op"]
+    if op == "insert":
+        try:
+            row = db.execute(f"{INSERT_STUDENT_SQL} RETURNING {STUDENT_COLUMNS}", operation["fields"]).fetchone()
+        except sqlite3.IntegrityError:
+            return {"ok": False, "status": 409, "error": "学生姓名已存在，请勿重复添加"}
+        return {"ok": True, "id": row["id"], "student": row_to_dict(row)}
+
+    if op == "delete":
+        row = db.execute("DELETE FROM students WHERE id = ? RETURNING id", (operation["id"],)).fetchone()
+        if row is None:
+            return {"ok": False, "status": 404, "error": "学生不存在"}
+        return {"ok": True}
+
+    if op == "subject":
+        sql = f"UPDATE students SET {operation['subject']} = ? WHERE id = ? RETURNING {STUDENT_COLUMNS}"
+        params: list[Any] = [operation["score"], operation["id"]]
+    else:
+        fields = operation["fields"]
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        sql = f"UPDATE students SET {assignments} WHERE id = ? RETURNING {STUDENT_COLUMNS}"
+        params = [*fields.values(), operation["id"]]
+
+    try:
+        row = db.execute(sql, params).fetchone()
+    except sqlite3.IntegrityError:
+        return {"ok": False, "status": 409, "error": "学生姓名已存在"}
+    if row is None:
+        return {"ok": False, "status": 404, "error": "学生不存在"}
+    return {"ok": True, "student": row_to_dict(row)}
+
+
+def apply_student_operations(
+    db: sqlite3.Connection,
+    operations: list[dict[str, Any] | ValueError],
+    atomic: bool = False,
+) -> list[dict[str, Any]]:
+    results: list[dict[str, Any]] = []
+    started = time.perf_counter()
+    db.execute("BEGIN IMMEDIATE")
+    metrics.observe_lock_wait(time.perf_counter() - started)
+    try:
+        for index, operation in enumerate(operations):
+            if isinstance(operation, ValueError):
+                results.append({"index": index, "ok": False, "status": 400, "error": str(operation)})
+                continue
+            db.execute("SAVEPOINT batch_op")
+            result = apply_operation(db, operation)
+            if not result["ok"]:
+                db.execute("ROLLBACK TO batch_op")
+            db.execute("RELEASE batch_op")
+            results.append({"index": index, "op": operation["op"], "id": operation["id"], **result})
+
+        if atomic and not all(result["ok"] for result in results):
+            db.rollback()
+            for result in results:
+                if result["ok"]:
+                    result.update({"ok": False, "status": 409, "error": "批次中有失败操作，已整体回滚"})
+                    result.pop("student", None)
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return results
+
+
+@dataclass
+class PendingWrite:
+    operation: dict[str, Any]
+    ready: threading.Event = field(default_factory=threading.Event)
+    leader: bool = False
+    result: dict[str, Any] | None = None
+    error: BaseException | None = None
+    batch_size: int = 0
+
+
+class WriteCoordinator:
+    # Group commit for single-row writes within a worker: the first waiting
+    # request leads, gathers whatever arrives within the delay (up to
+    # max_batch), applies it in one transaction and hands over to the next.
+    def __init__(self, max_batch: int, max_delay: float) -> None:
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self.condition = threading.Condition()
+        self.queue: list[PendingWrite] = []
+        self.leading = False
+
+    def submit(self, db: sqlite3.Connection, operation: dict[str, Any]) -> dict[str, Any]:
+        entry = PendingWrite(operation)
+        with self.condition:
+            self.queue.append(entry)
+            if not self.leading:
+                self.leading = entry.leader = True
+            elif len(self.queue) >= self.max_batch:
+                self.condition.notify_all()
+        if not entry.leader:
+            entry.ready.wait()
+        if entry.leader:
+            self.lead(db)
+        metrics.note("write", f"batch of {entry.batch_size}")
+        if entry.error is not None:
+            raise entry.error
+        return entry.result
+
+    def lead(self, db: sqlite3.Connection) -> None:
+        deadline = time.monotonic() + self.max_delay
+        with self.condition:
+            while len(self.queue) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = self.queue[: self.max_batch]
+            del self.queue[: self.max_batch]
+
+        try:
+            results = apply_student_operations(db, [entry.operation for entry in batch])
+        except sqlite3.OperationalError:
+            # Typically the busy timeout expired while another worker held the lock.
+            metrics.observe_write_busy()
+            results = [{"ok": False, "status": 503, "error": "数据库繁忙，请稍后重试"} for _ in batch]
+        except BaseException as exc:
+            for entry in batch:
+                entry.error = exc
+            results = [{} for _ in batch]
+        metrics.observe_write_batch(len(batch))
+
+        with self.condition:
+            successor = self.queue[0] if self.queue else None
+            if successor is None:
+                self.leading = False
+            else:
+                successor.leader = True
+        for entry, result in zip(batch, results):
+            entry.result = result
+            entry.batch_size = len(batch)
+            entry.leader = False
+            entry.ready.set()
+        if successor is not None:
+            successor.ready.set()
+
+
+write_coordinators: dict[str, WriteCoordinator] = {}
+
+
+def current_write_coordinator() -> WriteCoordinator:
+    return per_database(write_coordinators, lambda _: WriteCoordinator(WRITE_BATCH_MAX, WRITE_BATCH_DELAY_MS / 1000))
+
+
+def build_stats(
+    keyword: str = "",
+    min_total: int = 0,
+    max_total: int = TOTAL_MAX,
+    include_series: bool = True,
+    point_budget: int | None = None,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+) -> dict[str, Any]:
+    if point_budget is not None:
+        return build_compact_stats(keyword, min_total, max_total, point_budget, ranges)
+
+    if not keyword and not ranges and min_total <= 0 and max_total >= TOTAL_MAX:
+        agg = load_aggregate(get_db())
+        columns = fetch_score_columns() if include_series else None
+        top10 = columns.students(0, 10) if columns is not None else fetch_students(limit=10)
+        return render_stats(agg, columns, top10)
+
+    if not include_series:
+        agg = aggregate_filtered(keyword, min_total, max_total, ranges)
+        top10 = fetch_students(keyword=keyword, min_total=min_total, max_total=max_total, limit=10, ranges=ranges)
+        return render_stats(agg, None, top10)
+
+    columns = fetch_score_columns(keyword=keyword, min_total=min_total, max_total=max_total, ranges=ranges)
+    return render_stats(aggregate_columns(columns), columns, columns.students(0, 10))
+
+
+def build_compact_stats(
+    keyword: str,
+    min_total: int,
+    max_total: int,
+    point_budget: int,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+) -> dict[str, Any]:
+    agg = aggregate_filtered(keyword, min_total, max_total, ranges)
+
+    top10 = fetch_students(keyword=keyword, min_total=min_total, max_total=max_total, limit=10, ranges=ranges)
+    if agg.count <= point_budget:
+        scatter = scatter_points(
+            fetch_score_columns(keyword=keyword, min_total=min_total, max_total=max_total, ranges=ranges)
+        )
+    else:
+        scatter = binned_scatter(keyword, min_total, max_total, point_budget, agg, ranges)
+    return render_stats(agg, None, top10, scatter)
+
+
+def build_cross_exam_stats(
+    exam_ids: list[str],
+    keyword: str,
+    min_total: int,
+    max_total: int,
+    ranges: tuple[tuple[str, int, int], ...] = (),
+) -> dict[str, Any]:
+    # Each exam is aggregated in its own file and the sums are merged, so the
+    # result matches one query over the union without ever copying rows.
+    merged = ScoreAggregate()
+    leaders: list[dict[str, Any]] = []
+    counts = []
+    for exam_id in exam_ids:
+        path = exam_database_path(exam_id)
+        prepare_database(path)
+        with use_database(path):
+            agg = aggregate_filtered(keyword, min_total, max_total, ranges)
+            top10 = fetch_students(keyword=keyword, min_total=min_total, max_total=max_total, limit=10, ranges=ranges)
+        merged.merge(agg)
+        counts.append({"exam": exam_id, "count": agg.count})
+        leaders.extend({**student, "exam": exam_id} for student in top10)
+
+    leaders.sort(key=lambda s: (-s["total"], -s["chinese"], -s["math"], -s["english"], s["exam"], s["id"]))
+    stats = render_stats(merged, None, leaders[:10])
+    stats["exams"] = counts
+    return stats
+
+
+def build_dashboard(filters: list[tuple[str, int, int]], page_size: int = DASHBOARD_PAGE_SIZE) -> list[dict[str, Any]]:
+    low = min(min_total for _, min_total, _ in filters)
+    high = max(max_total for _, _, max_total in filters)
+    # The page and top10 both come from the head of the ranked rows.
+    head = max(page_size, 10) + 1
+    shared: ScoreColumns | None = None
+    results = []
+    for keyword, min_total, max_total in filters:
+        if len(filters) == 1 and not keyword and min_total <= 0 and max_total >= TOTAL_MAX:
+            agg = load_aggregate(get_db())
+            rows = fetch_student_rows(limit=head)
+        else:
+            if len(filters) == 1 or "%" in keyword or "_" in keyword:
+                columns = fetch_score_columns(keyword=keyword, min_total=min_total, max_total=max_total)
+            else:
+                # Every filter set is cut from one scan of the widest total range.
+                if shared is None:
+                    shared = fetch_score_columns(min_total=low, max_total=high)
+                columns = shared.between(min_total, max_total)
+                if keyword:
+                    columns = columns.matching(keyword)
+            agg = aggregate_columns(columns)
+            rows = columns.rows(0, head)
+
+        students = [tuple_to_student(row) for row in rows[:page_size]]
+        results.append(
+            {
+                "filter": {"keyword": keyword, "min_total": min_total, "max_total": max_total},
+                "students": students,
+                "next": encode_cursor(students[-1]) if len(rows) > page_size else None,
+                "total": agg.count,
+                "stats": render_stats(agg, None, [tuple_to_student(row) for row in rows[:10]]),
+            }
+        )
+    return results
+
+
+def iter_student_batches(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list[tuple[Any, ...]]]:
+    columns = current_column_store().view(get_db())
+    if columns is not None:
+        for start in range(0, columns.count, batch_size):
+            yield columns.rows(start, start + batch_size)
+        return
+
+    sql, params = student_query()
+    cursor = get_db().cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def tuple_to_student(row: tuple[Any, ...]) -> dict[str, Any]:
+    return dict(zip(STUDENT_FIELDS, row))
+
+
+def encode_json(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def dump_json(value: Any) -> str:
+    return encode_json(value).decode("utf-8")
+
+
+def iter_csv_export() -> Iterator[str]:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    rank = 0
+    for rows in iter_student_batches():
+        for row in rows:
+            rank += 1
+            writer.writerow([rank, *row[1:]])
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+    if output.tell():
+        yield output.getvalue()
+
+
+def iter_json_export() -> Iterator[str]:
+    yield '{"students":['
+    count = 0
+    for rows in iter_student_batches():
+        chunk = ",".join(dump_json(tuple_to_student(row)) for row in rows)
+        yield ("," if count else "") + chunk
+        count += len(rows)
+    yield f'],"count":{count}}}'
+
+
+def iter_columnar_json_export() -> Iterator[str]:
+    # Columns cannot be streamed whole, so each fetch batch is its own block.
+    yield '{"format":"columns","batches":['
+    count = 0
+    for rows in iter_student_batches():
+        yield ("," if count else "") + dump_json(rows_to_columns(rows))
+        count += len(rows)
+    yield f'],"count":{count}}}'
+
+
+def write_snapshot_file(directory: str, name: str, body: bytes) -> None:
+    path = os.path.join(directory, name)
+    variants = [(path, body), (f"{path}.gz", gzip.compress(body, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((f"{path}.br", brotli.compress(body, quality=11)))
+    for target, data in variants:
+        with open(f"{target}.tmp", "wb") as handle:
+            handle.write(data)
+        os.replace(f"{target}.tmp", target)
+
+
+def write_static_snapshot(directory: str = SNAPSHOT_DIR, student_limit: int | None = SNAPSHOT_STUDENT_LIMIT) -> dict[str, Any]:
+    db = get_db()
+    # Read everything from one snapshot so stats, the list and the manifest agree.
+    db.execute("BEGIN")
+    try:
+        version = current_data_version(db)
+        stats = build_stats(include_series=False)
+        bodies = {
+            "stats": encode_json(stats),
+            "students": encode_json({"students": fetch_students(limit=student_limit)}),
+        }
+    finally:
+        db.rollback()
+
+    os.makedirs(directory, exist_ok=True)
+    manifest: dict[str, Any] = {"version": version, "count": stats["count"]}
+    for kind, body in bodies.items():
+        # Content-addressed names let static hosts cache the data files forever.
+        name = f"{kind}.{hashlib.sha1(body).hexdigest()[:12]}.json"
+        write_snapshot_file(directory, name, body)
+        manifest[kind] = name
+    write_snapshot_file(directory, "manifest.json", encode_json(manifest))
+
+    current = {manifest[kind] for kind in SNAPSHOT_KINDS}
+    for name in os.listdir(directory):
+        base = name.removesuffix(".gz").removesuffix(".br")
+        if base.split(".", 1)[0] in SNAPSHOT_KINDS and base.endswith(".json") and base not in current:
+            os.remove(os.path.join(directory, name))
+    return manifest
+
+
+def iter_ndjson_export() -> Iterator[str]:
+    for rows in iter_student_batches():
+        yield "".join(dump_json(tuple_to_student(row)) + "\n" for row in rows)
+
+
+def gzip_chunks(chunks: Iterable[str]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streamed_export(chunks: Iterator[str], mimetype: str, filename: str | None) -> Response:
+    if request.args.get("gzip", "0") == "1":
+        response = Response(stream_with_context(gzip_chunks(chunks)), mimetype="application/gzip")
+        response.headers["Content-Disposition"] = f"attachment; filename={filename or 'score_atlas_export.json'}.gz"
+        return response
+
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    if filename:
+        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def iter_ndjson_records(stream: io.TextIOBase) -> Iterator[tuple[int, Any]]:
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError:
+            yield line_no, ValueError("JSON 解析失败")
 
-    name = str(payload.get("name", "")).strip()
-    if not name:
-        raise ValueError("姓名不能为空")
 
-    cleaned: dict[str, Any] = {"name": name}
-    for subject in SUBJECT_CODES:
-        if require_all and subject not in payload:
-            raise ValueError(f"缺少学科字段：{subject}")
-        if subject in payload:
-            cleaned[subject] = validate_score(subject, payload[subject])
+def iter_csv_records(stream: io.TextIOBase) -> Iterator[tuple[int, Any]]:
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = []
+    for column in header:
+        column = column.strip()
+        if column == "姓名":
+            fields.append("name")
+        elif column in LABEL_TO_CODE:
+            fields.append(LABEL_TO_CODE[column])
+        else:
+            fields.append(column)
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield reader.line_num, dict(zip(fields, row))
 
-    if require_all and any(subject not in cleaned for subject in SUBJECT_CODES):
-        raise ValueError("学科字段不完整")
 
-    return cleaned
+def existing_names(db: sqlite3.Connection, names: list[str], table: str = "students") -> set[str]:
+    found: set[str] = set()
+    for start in range(0, len(names), 500):
+        chunk = names[start : start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        found.update(row[0] for row in db.execute(f"SELECT name FROM {table} WHERE name IN ({placeholders})", chunk))
+    return found
 
 
-def build_stats(keyword: str = "", min_total: int = 0, max_total: int = TOTAL_MAX) -> dict[str, Any]:
-    students = fetch_students(keyword=keyword, min_total=min_total, max_total=max_total)
-    if not students:
-        return {
-            "count": 0,
-            "avgTotal": 0,
-            "maxTotal": 0,
-            "minTotal": 0,
-            "excellentRate": 0,
-            "qualifiedRate": 0,
-            "subjectAverages": [],
-            "segments": [],
-            "histogram": [],
-            "top10": [],
-            "scatter": [],
-            "subjectSeries": {},
-            "correlations": [],
-        }
+def ingest_batch(
+    db: sqlite3.Connection,
+    batch: list[tuple[int, dict[str, Any]]],
+    mode: str,
+    report: dict[str, Any],
+    table: str = "students",
+) -> None:
+    names = [cleaned["name"] for _, cleaned in batch]
+    existing = existing_names(db, names, table)
+    rows = []
+    seen: set[str] = set()
+    for line_no, cleaned in batch:
+        name = cleaned["name"]
+        if mode == "upsert":
+            if name in existing or name in seen:
+                report["updated"] += 1
+            else:
+                report["inserted"] += 1
+        elif name in existing or name in seen:
+            reject_record(report, line_no, f"姓名重复：{name}", name)
+            continue
+        else:
+            report["inserted"] += 1
+        seen.add(name)
+        rows.append(cleaned)
 
-    totals = [s["total"] for s in students]
-    count = len(students)
+    sql = INSERT_STUDENT_SQL.replace("INSERT INTO students", f"INSERT INTO {table}", 1)
+    if mode == "upsert":
+        updates = ", ".join(f"{code} = excluded.{code}" for code in SUBJECT_CODES)
+        sql += f" ON CONFLICT(name) DO UPDATE SET {updates}"
+    db.executemany(sql, rows)
 
-    subject_series_code = {code: [s[code] for s in students] for code in SUBJECT_CODES}
-    subject_averages = [
-        {
-            "code": code,
-            "label": SUBJECT_LABELS[code],
-            "avg": round(mean(subject_series_code[code]), 2),
-            "max": SUBJECT_MAX[code],
-        }
-        for code in SUBJECT_CODES
-    ]
 
-    segments = [
-        {"label": "350以下", "count": sum(1 for t in totals if t < 350)},
-        {"label": "350-449", "count": sum(1 for t in totals if 350 <= t <= 449)},
-        {"label": "450-549", "count": sum(1 for t in totals if 450 <= t <= 549)},
-        {"label": "550-649", "count": sum(1 for t in totals if 550 <= t <= 649)},
-        {"label": "650及以上", "count": sum(1 for t in totals if t >= 650)},
-    ]
+def reject_record(report: dict[str, Any], line_no: int, error: str, name: str | None = None) -> None:
+    report["rejected"] += 1
+    if len(report["errors"]) < IMPORT_ERROR_LIMIT:
+        report["errors"].append({"line": line_no, "name": name, "error": error})
 
-    step = 25
-    hist_start = max(0, (min(totals) // step) * step)
-    hist_end = min(TOTAL_MAX + step, ((max(totals) // step) + 2) * step)
-    histogram = []
-    for left in range(hist_start, hist_end, step):
-        right = left + step
-        if right >= hist_end:
-            count_in_bin = sum(1 for t in totals if left <= t <= right)
-        else:
-            count_in_bin = sum(1 for t in totals if left <= t < right)
-        histogram.append(
-            {
-                "label": f"{left}-{right - 1}",
-                "left": left,
-                "count": count_in_bin,
+
+def ingest_students(records: Iterator[tuple[int, Any]], mode: str, batch_size: int = IMPORT_BATCH_SIZE) -> dict[str, Any]:
+    db = get_db()
+    report: dict[str, Any] = {"mode": mode, "inserted": 0, "updated": 0, "rejected": 0, "batches": 0, "errors": []}
+    # A replace streams the upload into a connection-local staging table in
+    # batches, then swaps it in with one short transaction. The old rows only
+    # go once the whole upload has been read, and the database write lock is
+    # never held while the client is still sending.
+    replace = mode == "replace"
+    table = "students"
+    if replace:
+        table = IMPORT_STAGING_TABLE
+        db.execute(f"DROP TABLE IF EXISTS {table}")
+        columns = ", ".join(f"{code} INTEGER NOT NULL" for code in SUBJECT_CODES)
+        db.execute(f"CREATE TABLE {table} (name TEXT NOT NULL UNIQUE, {columns})")
+
+    batch: list[tuple[int, dict[str, Any]]] = []
+
+    def flush() -> None:
+        if batch:
+            ingest_batch(db, batch, mode, report, table)
+            report["batches"] += 1
+        db.commit()
+        batch.clear()
+
+    try:
+        for line_no, item in records:
+            if isinstance(item, ValueError):
+                reject_record(report, line_no, str(item))
+                continue
+            try:
+                cleaned = parse_student_payload(item, require_all=True)
+            except ValueError as exc:
+                name = item.get("name") if isinstance(item, dict) else None
+                reject_record(report, line_no, str(exc), str(name) if name is not None else None)
+                continue
+            batch.append((line_no, cleaned))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        if replace and not report["inserted"]:
+            report["error"] = "替换导入没有可用的记录，原有数据未改动"
+        elif replace:
+            fields = ", ".join(["name", *SUBJECT_CODES])
+            with db:
+                db.execute("DELETE FROM students")
+                db.execute(f"INSERT INTO students ({fields}) SELECT {fields} FROM {table} ORDER BY rowid")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if replace:
+            db.execute(f"DROP TABLE IF EXISTS {table}")
+
+    report["truncatedErrors"] = report["rejected"] > len(report["errors"])
+    return report
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.versions: dict[Any, str] = {}
+        self.size = 0
+        self.entries: OrderedDict[tuple[Any, ...], bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _sync_version(self, scope: Any, version: str) -> None:
+        # Keys start with their database path; a write to one exam only drops
+        # that exam's entries.
+        if version != self.versions.get(scope):
+            for key in [key for key in self.entries if key[0] == scope]:
+                self.size -= len(self.entries.pop(key))
+            self.versions[scope] = version
+
+    def get(self, version: str, key: tuple[Any, ...]) -> bytes | None:
+        with self.lock:
+            self._sync_version(key[0], version)
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, version: str, key: tuple[Any, ...], body: bytes) -> None:
+        if len(body) > self.max_bytes // 4:
+            return
+        with self.lock:
+            self._sync_version(key[0], version)
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = body
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_BYTES)
+
+
+def negotiate_encoding() -> str | None:
+    requested = request.args.get("compress")
+    if requested is not None:
+        if requested == "br" and brotli is not None:
+            return "br"
+        return "gzip" if requested == "gzip" else None
+    offers = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offers)
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def wants_columns() -> bool:
+    requested = request.args.get("format")
+    if requested is not None:
+        return requested == "columns"
+    return request.accept_mimetypes.best_match(["application/json", COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE
+
+
+def cached_json_response(
+    key: tuple[Any, ...],
+    build: Callable[[], Any],
+    mimetype: str = "application/json",
+) -> Response:
+    if request.args.get("explain") == "1":
+        # Debug mode: always rebuilt and never cached, with every SQL query that ran.
+        g.explain = []
+        started = time.perf_counter()
+        payload = build()
+        elapsed = round((time.perf_counter() - started) * 1000, 3)
+        return jsonify({**payload, "explain": {"ms": elapsed, "queries": g.pop("explain")}})
+
+    version = current_data_version(get_db())
+    key = (database_path(), *key)
+    digest = hashlib.sha1(repr((key, mimetype)).encode("utf-8")).hexdigest()[:16]
+    etag = f"{version}-{digest}"
+    encoding = None
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        body = response_cache.get(version, key)
+        metrics.note("cache", "miss" if body is None else "hit")
+        if body is None:
+            payload = build()
+            with metrics.phase("serialize"):
+                body = encode_json(payload)
+            response_cache.put(version, key, body)
+
+        encoding = negotiate_encoding() if len(body) >= COMPRESS_MIN_BYTES else None
+        if encoding is not None:
+            # Compressed variants are cached next to the identity body.
+            encoded_key = (*key, encoding)
+            compressed = response_cache.get(version, encoded_key)
+            if compressed is None:
+                with metrics.phase("compress"):
+                    compressed = compress_body(body, encoding)
+                response_cache.put(version, encoded_key, compressed)
+            body = compressed
+        response = Response(body, mimetype=mimetype)
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+
+    # Encoded bodies differ byte-wise from the identity one, so their tag is weak.
+    response.set_etag(etag, weak=encoding is not None)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def compress_response(response: Response) -> Response:
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or not response.is_json
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    encoding = negotiate_encoding() if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding is None:
+        return response
+    with metrics.phase("compress"):
+        response.set_data(compress_body(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def new_histogram(buckets: tuple[float, ...] = LATENCY_BUCKETS) -> list[float]:
+    return [0] * (len(buckets) + 1) + [0.0]
+
+
+def observe_histogram(histogram: list[float], value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+    histogram[bisect_left(buckets, value)] += 1
+    histogram[-1] += value
+
+
+def prometheus_labels(**labels: str) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_histogram(
+    name: str,
+    histogram: list[float],
+    buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    **labels: str,
+) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(buckets, histogram):
+        cumulative += count
+        lines.append(f"{name}_bucket{prometheus_labels(**labels, le=repr(bound))} {cumulative}")
+    cumulative += histogram[len(buckets)]
+    lines.append(f"{name}_bucket{prometheus_labels(**labels, le='+Inf')} {cumulative}")
+    lines.append(f"{name}_sum{prometheus_labels(**labels)} {histogram[-1]:.6f}")
+    lines.append(f"{name}_count{prometheus_labels(**labels)} {cumulative}")
+    return lines
+
+
+class MetricsRegistry:
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.pid = os.getpid()
+        # Workers of one server share a parent (the gunicorn master). The file
+        # name carries it, and a start token so a recycled pid never overwrites
+        # the file of the worker that had it before.
+        self.group = os.getppid()
+        self.filename = f"worker-{self.group}-{self.pid}-{time.time_ns():x}.json"
+        self.local = threading.local()
+        self.requests: Counter[tuple[str, str, str]] = Counter()
+        self.latency: dict[tuple[str, str], list[float]] = {}
+        self.sql: dict[str, list[float]] = {}
+        self.queries = new_histogram()
+        self.write_batches = new_histogram(BATCH_SIZE_BUCKETS)
+        self.lock_waits = new_histogram()
+        self.write_busy = 0
+        self.flushed_at = 0.0
+
+    def start_request(self) -> None:
+        if os.getpid() != self.pid:
+            # Counters inherited from the master must not be reported twice.
+            with self.lock:
+                if os.getpid() != self.pid:
+                    self._reset()
+        local = self.local
+        local.active = True
+        local.sql = 0.0
+        local.queries = 0
+        local.phases = {}
+        local.notes = {}
+        local.started = time.perf_counter()
+
+    def observe_query(self, seconds: float) -> None:
+        local = self.local
+        if getattr(local, "active", False):
+            local.sql += seconds
+            local.queries += 1
+        with self.lock:
+            observe_histogram(self.queries, seconds)
+
+    def observe_sql(self, seconds: float) -> None:
+        local = self.local
+        if getattr(local, "active", False):
+            local.sql += seconds
+
+    def observe_write_batch(self, size: int) -> None:
+        with self.lock:
+            observe_histogram(self.write_batches, size, BATCH_SIZE_BUCKETS)
+
+    def observe_lock_wait(self, seconds: float) -> None:
+        with self.lock:
+            observe_histogram(self.lock_waits, seconds)
+
+    def observe_write_busy(self) -> None:
+        with self.lock:
+            self.write_busy += 1
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases = getattr(self.local, "phases", None)
+            if phases is not None:
+                phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+    def note(self, name: str, description: str) -> None:
+        notes = getattr(self.local, "notes", None)
+        if notes is not None:
+            notes[name] = description
+
+    def finish_request(self, method: str, route: str, status: int) -> str | None:
+        local = self.local
+        if not getattr(local, "active", False):
+            return None
+        local.active = False
+        total = time.perf_counter() - local.started
+
+        with self.lock:
+            self.requests[(method, route, str(status))] += 1
+            observe_histogram(self.latency.setdefault((method, route), new_histogram()), total)
+            sql = self.sql.setdefault(route, [0.0, 0])
+            sql[0] += local.sql
+            sql[1] += local.queries
+            flush = time.monotonic() - self.flushed_at >= METRICS_FLUSH_SECONDS
+            if flush:
+                self.flushed_at = time.monotonic()
+        if flush:
+            self.flush()
+
+        entries = [f'sql;dur={local.sql * 1000:.2f};desc="queries: {local.queries}"']
+        entries.extend(f"{name};dur={seconds * 1000:.2f}" for name, seconds in local.phases.items())
+        app_seconds = max(total - local.sql - sum(local.phases.values()), 0.0)
+        entries.append(f"app;dur={app_seconds * 1000:.2f}")
+        entries.extend(f'{name};desc="{description}"' for name, description in local.notes.items())
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "latency": [[*key, list(histogram)] for key, histogram in self.latency.items()],
+                "sql": [[route, *values] for route, values in self.sql.items()],
+                "queries": list(self.queries),
+                "writeBatches": list(self.write_batches),
+                "lockWaits": list(self.lock_waits),
+                "writeBusy": self.write_busy,
             }
-        )
 
-    top10 = students[:10]
-    scatter = [
-        {
-            "name": s["name"],
-            "math": s["math"],
-            "english": s["english"],
-            "total": s["total"],
-        }
-        for s in students
-    ]
+    def flush(self) -> dict[str, Any]:
+        snapshot = self.snapshot()
+        write_json_atomic(os.path.join(self.directory, self.filename), snapshot)
+        return snapshot
+
+    def worker_files(self) -> list[tuple[str, int | None, int]]:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        files = []
+        for name in names:
+            if not name.startswith("worker-") or not name.endswith(".json"):
+                continue
+            parts = name[len("worker-") : -len(".json")].split("-")
+            if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+                files.append((name, int(parts[0]), int(parts[1])))
+            elif len(parts) == 1 and parts[0].isdigit():
+                # worker-<pid>.json, written before files carried their server.
+                files.append((name, None, int(parts[0])))
+        return files
 
-    subject_series_labeled = {SUBJECT_LABELS[code]: values for code, values in subject_series_code.items()}
+    def retire_exited(self, files: list[tuple[str, int | None, int]]) -> None:
+        # Files of exited workers are folded into one retired total per server,
+        # so the counters never go backwards and the directory stays as small
+        # as the worker pool. Files left by earlier servers are deleted.
+        lock_path = os.path.join(self.directory, "retire.lock")
+        try:
+            if os.path.exists(lock_path) and time.time() - os.path.getmtime(lock_path) > METRICS_FLUSH_SECONDS * 30:
+                os.remove(lock_path)
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError:
+            # Another worker is retiring files; this scrape reads them as they are.
+            return
+        try:
+            retired_path = os.path.join(self.directory, f"retired-{self.group}.json")
+            retired = read_json(retired_path) or {**merge_snapshots([]), "workers": 0, "folded": []}
+            exited = []
+            for name, group, pid in files:
+                if group == self.group:
+                    if pid != self.pid and not process_alive(pid):
+                        exited.append(name)
+                elif (group is None or not process_alive(group)) and not process_alive(pid):
+                    remove_file(os.path.join(self.directory, name))
+            fresh = [name for name in exited if name not in retired["folded"]]
+            if fresh:
+                snapshots = [read_json(os.path.join(self.directory, name)) for name in fresh]
+                merged = merge_snapshots([retired, *(snapshot for snapshot in snapshots if snapshot is not None)])
+                retired = {**merged, "workers": retired["workers"] + len(fresh), "folded": exited}
+                # The total is replaced before the files go; readers skip names
+                # listed in "folded", so no scrape counts a worker twice.
+                write_json_atomic(retired_path, retired)
+            for name in exited:
+                remove_file(os.path.join(self.directory, name))
+            for name in os.listdir(self.directory):
+                group = name[len("retired-") : -len(".json")]
+                if name.startswith("retired-") and group.isdigit() and int(group) != self.group and not process_alive(int(group)):
+                    remove_file(os.path.join(self.directory, name))
+        finally:
+            os.close(lock_fd)
+            remove_file(lock_path)
+
+    def collect(self) -> tuple[list[dict[str, Any]], dict[str, Any] | None]:
+        snapshots = [self.flush()]
+        self.retire_exited(self.worker_files())
+        retired = read_json(os.path.join(self.directory, f"retired-{self.group}.json"))
+        folded = retired["folded"] if retired else []
+        for name, group, _ in self.worker_files():
+            if group != self.group or name == self.filename or name in folded:
+                continue
+            snapshot = read_json(os.path.join(self.directory, name))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots, retired
+
+    def render(self) -> str:
+        snapshots, retired = self.collect()
+        merged = merge_snapshots([*snapshots, retired] if retired else snapshots)
+        requests = {(method, route, status): count for method, route, status, count in merged["requests"]}
+        latency = {(method, route): histogram for method, route, histogram in merged["latency"]}
+        sql = {route: (seconds, count) for route, seconds, count in merged["sql"]}
+        queries = merged["queries"]
+        write_batches = merged["writeBatches"]
+        lock_waits = merged["lockWaits"]
+        write_busy = merged["writeBusy"]
+
+        lines = [
+            "# HELP scoreatlas_requests_total HTTP requests handled, by route and status.",
+            "# TYPE scoreatlas_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f"scoreatlas_requests_total{prometheus_labels(method=method, route=route, status=status)} {count}")
+        lines += [
+            "# HELP scoreatlas_request_duration_seconds Time spent handling a request, up to the first response byte.",
+            "# TYPE scoreatlas_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(latency.items()):
+            lines += render_histogram("scoreatlas_request_duration_seconds", histogram, method=method, route=route)
+        lines += [
+            "# HELP scoreatlas_request_sql_seconds_total SQL time (execute, fetch and commit) spent inside requests.",
+            "# TYPE scoreatlas_request_sql_seconds_total counter",
+        ]
+        for route, (seconds, _) in sorted(sql.items()):
+            lines.append(f"scoreatlas_request_sql_seconds_total{prometheus_labels(route=route)} {seconds:.6f}")
+        lines += [
+            "# HELP scoreatlas_request_sql_queries_total SQL statements executed inside requests.",
+            "# TYPE scoreatlas_request_sql_queries_total counter",
+        ]
+        for route, (_, count) in sorted(sql.items()):
+            lines.append(f"scoreatlas_request_sql_queries_total{prometheus_labels(route=route)} {count}")
+        lines += [
+            "# HELP scoreatlas_sql_query_duration_seconds Time spent executing a single SQL statement.",
+            "# TYPE scoreatlas_sql_query_duration_seconds histogram",
+        ]
+        lines += render_histogram("scoreatlas_sql_query_duration_seconds", queries)
+        lines += [
+            "# HELP scoreatlas_write_batch_size Operations committed together by the write coordinator.",
+            "# TYPE scoreatlas_write_batch_size histogram",
+        ]
+        lines += render_histogram("scoreatlas_write_batch_size", write_batches, BATCH_SIZE_BUCKETS)
+        lines += [
+            "# HELP scoreatlas_write_lock_wait_seconds Time spent waiting for the SQLite write lock.",
+            "# TYPE scoreatlas_write_lock_wait_seconds histogram",
+        ]
+        lines += render_histogram("scoreatlas_write_lock_wait_seconds", lock_waits)
+        lines += [
+            "# HELP scoreatlas_write_busy_total Write batches that failed because the database stayed locked.",
+            "# TYPE scoreatlas_write_busy_total counter",
+            f"scoreatlas_write_busy_total {write_busy}",
+        ]
+        lines += [
+            "# HELP scoreatlas_metrics_workers Live worker processes whose metrics are included.",
+            "# TYPE scoreatlas_metrics_workers gauge",
+            f"scoreatlas_metrics_workers {len(snapshots)}",
+            "# HELP scoreatlas_metrics_retired_workers_total Exited workers folded into the retired totals.",
+            "# TYPE scoreatlas_metrics_retired_workers_total counter",
+            f"scoreatlas_metrics_retired_workers_total {retired['workers'] if retired else 0}",
+        ]
+        return "\n".join(lines) + "\n"
 
-    correlations = []
-    for code_x, label_x, _ in SUBJECT_META:
-        for code_y, label_y, _ in SUBJECT_META:
-            correlations.append(
-                {
-                    "x": label_x,
-                    "y": label_y,
-                    "value": pearson(subject_series_code[code_x], subject_series_code[code_y]),
-                }
-            )
 
+def merge_snapshots(snapshots: list[dict[str, Any]]) -> dict[str, Any]:
+    requests: Counter[tuple[str, str, str]] = Counter()
+    latency: dict[tuple[str, str], list[float]] = {}
+    sql: dict[str, list[float]] = {}
+    queries = new_histogram()
+    write_batches = new_histogram(BATCH_SIZE_BUCKETS)
+    lock_waits = new_histogram()
+    write_busy = 0
+    for snapshot in snapshots:
+        for method, route, status, count in snapshot["requests"]:
+            requests[(method, route, status)] += count
+        for method, route, histogram in snapshot["latency"]:
+            merged = latency.setdefault((method, route), new_histogram())
+            for i, value in enumerate(histogram):
+                merged[i] += value
+        for route, seconds, count in snapshot["sql"]:
+            merged = sql.setdefault(route, [0.0, 0])
+            merged[0] += seconds
+            merged[1] += count
+        for i, value in enumerate(snapshot["queries"]):
+            queries[i] += value
+        # Files written before the write coordinator existed lack these keys.
+        for i, value in enumerate(snapshot.get("writeBatches", [])):
+            write_batches[i] += value
+        for i, value in enumerate(snapshot.get("lockWaits", [])):
+            lock_waits[i] += value
+        write_busy += snapshot.get("writeBusy", 0)
     return {
-        "count": count,
-        "avgTotal": round(mean(totals), 2),
-        "maxTotal": max(totals),
-        "minTotal": min(totals),
-        "excellentRate": round(sum(1 for t in totals if t >= 600) * 100 / count, 2),
-        "qualifiedRate": round(sum(1 for t in totals if t >= 450) * 100 / count, 2),
-        "subjectAverages": subject_averages,
-        "segments": segments,
-        "histogram": histogram,
-        "top10": top10,
-        "scatter": scatter,
-        "subjectSeries": subject_series_labeled,
-        "correlations": correlations,
+        "requests": [[*key, count] for key, count in requests.items()],
+        "latency": [[*key, histogram] for key, histogram in latency.items()],
+        "sql": [[route, *values] for route, values in sql.items()],
+        "queries": queries,
+        "writeBatches": write_batches,
+        "lockWaits": lock_waits,
+        "writeBusy": write_busy,
+    }
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # EPERM: the pid exists but belongs to someone else.
+        return True
+    return True
+
+
+def read_json(path: str) -> Any:
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_atomic(path: str, value: Any) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as handle:
+            json.dump(value, handle)
+        os.replace(f"{path}.tmp", path)
+    except OSError:
+        # Metrics are best effort; a read-only disk must not fail requests.
+        pass
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+metrics = MetricsRegistry(METRICS_DIR)
+
+startup_timings: dict[str, float] = {}
+startup_pid = os.getpid()
+
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round((time.perf_counter() - started) * 1000, 3)
+
+
+def startup_report() -> dict[str, Any]:
+    return {
+        "pid": startup_pid,
+        # A worker forked from a preloaded master reports the master's pid and
+        # timings: it started with everything below already done.
+        "preloaded": os.getpid() != startup_pid,
+        "warmedUp": "warmup" in startup_timings,
+        "phasesMs": startup_timings,
     }
 
 
+def warm_up(app: Flask) -> None:
+    # Meant for the gunicorn master under --preload. Everything built here (NumPy,
+    # the mapped column file, the rank trees and the rendered hot responses) is
+    # inherited by every worker at fork instead of being rebuilt by each of them.
+    # Views are dispatched directly, so no request metrics are recorded.
+    load_numpy()
+    with app.app_context():
+        db = get_db()
+        current_column_store().view(db, wait=True)
+        current_rank_index().refresh(db)
+    for path in WARMUP_PATHS:
+        with app.test_request_context(path, headers={"Accept-Encoding": "br, gzip"}):
+            if request.routing_exception is not None:
+                click.echo(f"scoreatlas: skipping warmup path {path!r}: no such route", err=True)
+                continue
+            app.dispatch_request()
+    # The master's connections must not be carried into the workers.
+    connection_pool.close_local()
+
+
 def create_app() -> Flask:
+    # Interpreter start-up plus imports, as CPU time since the process began.
+    startup_timings["imports"] = round(time.process_time() * 1000, 3)
+    started = time.perf_counter()
     app = Flask(__name__)
-    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(DB_PATH)), exist_ok=True)
 
     @app.after_request
     def apply_cors_headers(response: Response) -> Response:
         response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, If-None-Match, Accept"
+        response.headers["Access-Control-Expose-Headers"] = "ETag, Server-Timing"
         response.headers["Access-Control-Allow-Methods"] = "GET, POST, PATCH, DELETE, OPTIONS"
+        response.headers["Timing-Allow-Origin"] = "*"
+        return response
+
+    if METRICS_ENABLED:
+
+        @app.before_request
+        def start_request_timer() -> None:
+            metrics.start_request()
+
+        @app.after_request
+        def record_request_metrics(response: Response) -> Response:
+            route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            timing = metrics.finish_request(request.method, route, response.status_code)
+            if timing:
+                response.headers["Server-Timing"] = timing
+            return response
+
+    @app.after_request
+    def negotiate_compression(response: Response) -> Response:
+        return compress_response(response)
+
+    @app.url_value_preprocessor
+    def pop_exam_id(_: str | None, values: dict[str, Any] | None) -> None:
+        if values and request.url_rule.rule.startswith("/api/exams/<exam_id>/"):
+            g.exam_id = values.pop("exam_id").lower()
+
+    @app.before_request
+    def route_to_exam() -> Response | None:
+        exam_id = g.pop("exam_id", None)
+        if exam_id is None:
+            rule = request.url_rule
+            if rule is None or not rule.rule.startswith("/api/") or rule.rule.startswith(EXAM_UNSCOPED_ROUTES):
+                return None
+            exam_id = request.args.get("exam", "").strip().lower()
+        if exam_id and not select_exam(exam_id):
+            return jsonify({"error": "考试不存在"}), 404
+        return None
+
+    @app.after_request
+    def sync_exam_count(response: Response) -> Response:
+        exam_id = g.get("exam")
+        if exam_id is not None and request.endpoint in EXAM_COUNT_ENDPOINTS and response.status_code < 400:
+            record_exam_count(exam_id)
         return response
 
     app.teardown_appcontext(close_db)
 
     with app.app_context():
-        init_db()
-        ensure_seeded()
+        with startup_phase("schema"):
+            init_db()
+            init_catalog()
+        app.config["SAMPLE_SEEDED"] = False
+        if SEED_SAMPLE_ENABLED:
+            with startup_phase("seed"):
+                app.config["SAMPLE_SEEDED"] = ensure_seeded()
+
+    def select_cli_exam(exam_id: str | None) -> None:
+        if exam_id and not select_exam(exam_id.lower()):
+            raise click.ClickException(f"exam {exam_id!r} does not exist, create it with `flask create-exam` first")
+
+    exam_option = click.option("--exam", "exam_id", default=None, help="Exam id to operate on (default database if omitted).")
+
+    @app.cli.command("check-stats")
+    @click.option("--repair/--no-repair", default=True, help="Rebuild the aggregate store when it drifts.")
+    @exam_option
+    def check_stats_command(repair: bool, exam_id: str | None) -> None:
+        select_cli_exam(exam_id)
+        if check_aggregates(repair=repair):
+            click.echo("stats aggregates are consistent")
+        elif repair:
+            click.echo("stats aggregates were inconsistent and have been rebuilt")
+        else:
+            click.echo("stats aggregates are inconsistent")
+            raise SystemExit(1)
+
+    @app.cli.command("generate")
+    @click.option("--count", default=100000, show_default=True, type=click.IntRange(min=1), help="Number of students to generate.")
+    @click.option("--seed", type=int, default=None, help="Random seed; the same seed reproduces the same cohort.")
+    @click.option("--append", is_flag=True, help="Keep existing students instead of replacing them.")
+    @click.option(
+        "--batch-size",
+        default=GENERATE_BATCH_SIZE,
+        show_default=True,
+        type=click.IntRange(min=1),
+        help="Students generated and inserted per batch.",
+    )
+    @exam_option
+    def generate_command(count: int, seed: int | None, append: bool, batch_size: int, exam_id: str | None) -> None:
+        select_cli_exam(exam_id)
+        started = time.perf_counter()
+        inserted = bulk_load_students(generate_cohort(count, seed, batch_size), replace=not append)
+        if g.get("exam") is not None:
+            record_exam_count(g.exam)
+        click.echo(f"loaded {inserted} students into {database_path()} in {time.perf_counter() - started:.1f}s")
+
+    @app.cli.command("snapshot")
+    @click.option(
+        "--out",
+        "directory",
+        default=SNAPSHOT_DIR,
+        show_default=True,
+        type=click.Path(file_okay=False),
+        help="Directory the snapshot files are written to.",
+    )
+    @click.option(
+        "--student-limit",
+        type=click.IntRange(min=0),
+        default=SNAPSHOT_STUDENT_LIMIT,
+        show_default=True,
+        help="Top N students in the ranking file; 0 writes every student.",
+    )
+    @exam_option
+    def snapshot_command(directory: str, student_limit: int, exam_id: str | None) -> None:
+        select_cli_exam(exam_id)
+        # A snapshot is published as-is, so it must never come from the random
+        # sample that start-up seeds into an empty database.
+        if not exam_id and app.config["SAMPLE_SEEDED"]:
+            raise click.ClickException(
+                f"{database_path()} was empty and has just been seeded with the random sample; "
+                "point SCOREATLAS_DB_PATH at a real database (set SCOREATLAS_SEED_SAMPLE=0 to skip seeding)"
+            )
+        if not get_db().execute("SELECT n FROM stats_moments WHERE id = 1").fetchone()[0]:
+            raise click.ClickException(f"{database_path()} has no students; refusing to publish an empty snapshot")
+        manifest = write_static_snapshot(directory, student_limit or None)
+        click.echo(f"wrote snapshot {manifest['version']} ({manifest['count']} students) to {directory}")
+
+    @app.cli.command("create-exam")
+    @click.argument("exam_id")
+    @click.option("--name", required=True, help="Display name of the exam.")
+    @click.option("--cohort", default="", help="Cohort the exam belongs to, e.g. 2025届.")
+    @click.option("--held-on", default=None, help="Exam date, e.g. 2025-06-07.")
+    def create_exam_command(exam_id: str, name: str, cohort: str, held_on: str | None) -> None:
+        try:
+            exam = parse_exam_payload({"id": exam_id, "name": name, "cohort": cohort, "held_on": held_on})
+        except ValueError as exc:
+            raise click.BadParameter(str(exc), param_hint="EXAM_ID")
+        try:
+            create_exam(exam)
+        except sqlite3.IntegrityError:
+            raise click.ClickException(f"exam {exam['id']!r} already exists")
+        click.echo(f"created exam {exam['id']} at {exam_database_path(exam['id'])}")
 
     @app.route("/")
     def root() -> Response:
@@ -487,23 +3866,105 @@ def create_app() -> Flask:
 
     @app.route("/api/health")
     def health() -> Response:
-        return jsonify({"status": "ok"})
+        return jsonify({"status": "ok", "pool": connection_pool.stats(), "startup": startup_report()})
+
+    @app.route("/api/metrics")
+    def metrics_text() -> Response:
+        return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.route("/api/exams", methods=["GET"])
+    def exams_list() -> Response:
+        return jsonify({"exams": list_exams()})
+
+    @app.route("/api/exams", methods=["POST"])
+    def add_exam() -> Response:
+        payload = request.get_json(silent=True) or {}
+        try:
+            exam = parse_exam_payload(payload)
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+        try:
+            created = create_exam(exam)
+        except sqlite3.IntegrityError:
+            return jsonify({"error": "考试编号已存在"}), 409
+        return jsonify({"message": "考试已创建", "exam": created}), 201
+
+    @app.route("/api/exams/<exam_id>", methods=["GET"])
+    def exam_detail(exam_id: str) -> Response:
+        exam = find_exam(exam_id.lower())
+        if exam is None:
+            return jsonify({"error": "考试不存在"}), 404
+        return jsonify(exam)
 
     @app.route("/api/students", methods=["GET"])
     def list_students() -> Response:
-        keyword = request.args.get("keyword", "").strip()
-        min_total = clamp(parse_int(request.args.get("min_total"), 0), 0, TOTAL_MAX)
-        max_total = clamp(parse_int(request.args.get("max_total"), TOTAL_MAX), 0, TOTAL_MAX)
-        if min_total > max_total:
-            min_total, max_total = max_total, min_total
+        keyword, min_total, max_total = parse_filter(request.args)
+        ranges = parse_subject_ranges(request.args)
+        try:
+            sort, descending = parse_sort(request.args)
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
 
         limit_arg = request.args.get("limit")
         limit = None
         if limit_arg is not None and limit_arg != "":
             limit = max(1, parse_int(limit_arg, 20))
 
-        students = fetch_students(keyword=keyword, min_total=min_total, max_total=max_total, limit=limit)
-        return jsonify({"students": students})
+        cursor = request.args.get("cursor", "").strip() or None
+        page_size_arg = request.args.get("page_size")
+        with_count = request.args.get("with_count", "0") == "1"
+        columnar = wants_columns()
+        mimetype = COLUMNAR_MIMETYPE if columnar else "application/json"
+        if cursor is None and not page_size_arg:
+
+            def build_list() -> dict[str, Any]:
+                rows = fetch_student_rows(
+                    keyword=keyword,
+                    min_total=min_total,
+                    max_total=max_total,
+                    limit=limit,
+                    ranges=ranges,
+                    sort=sort,
+                    descending=descending,
+                )
+                if columnar:
+                    return {"format": "columns", "count": len(rows), "students": rows_to_columns(rows)}
+                return {"students": [tuple_to_student(row) for row in rows]}
+
+            return cached_json_response(
+                ("students", keyword, min_total, max_total, limit, columnar, ranges, sort, descending),
+                build_list,
+                mimetype,
+            )
+
+        page_size = clamp(parse_int(page_size_arg, 100), 1, PAGE_SIZE_MAX)
+        if cursor is not None:
+            try:
+                decode_cursor(cursor, sort)
+            except ValueError as exc:
+                return jsonify({"error": str(exc)}), 400
+
+        def build_page() -> dict[str, Any]:
+            page = fetch_student_page(
+                keyword=keyword,
+                min_total=min_total,
+                max_total=max_total,
+                page_size=page_size,
+                cursor=cursor,
+                columnar=columnar,
+                ranges=ranges,
+                sort=sort,
+                descending=descending,
+            )
+            if with_count:
+                page["total"] = count_students(keyword=keyword, min_total=min_total, max_total=max_total, ranges=ranges)
+            return page
+
+        return cached_json_response(
+            ("students-page", keyword, min_total, max_total, page_size, cursor, with_count, columnar, ranges, sort, descending),
+            build_page,
+            mimetype,
+        )
 
     @app.route("/api/students", methods=["POST"])
     def add_student() -> Response:
@@ -513,24 +3974,10 @@ def create_app() -> Flask:
         except ValueError as exc:
             return jsonify({"error": str(exc)}), 400
 
-        db = get_db()
-        try:
-            cursor = db.execute(
-                """
-                INSERT INTO students (name, chinese, math, english, physics, chemistry, biology)
-                VALUES (:name, :chinese, :math, :english, :physics, :chemistry, :biology)
-                """,
-                cleaned,
-            )
-            db.commit()
-        except sqlite3.IntegrityError:
-            return jsonify({"error": "学生姓名已存在，请勿重复添加"}), 409
-
-        row = db.execute(
-            f"SELECT id, name, chinese, math, english, physics, chemistry, biology, {TOTAL_EXPR} AS total FROM students WHERE id = ?",
-            (cursor.lastrowid,),
-        ).fetchone()
-        return jsonify({"message": "新增成功", "student": row_to_dict(row)}), 201
+        result = current_write_coordinator().submit(get_db(), {"op": "insert", "id": None, "fields": cleaned})
+        if not result["ok"]:
+            return jsonify({"error": result["error"]}), result["status"]
+        return jsonify({"message": "新增成功", "student": result["student"]}), 201
 
     @app.route("/api/students/<int:student_id>/subject", methods=["PATCH"])
     def patch_student_subject(student_id: int) -> Response:
@@ -543,26 +3990,104 @@ def create_app() -> Flask:
         except ValueError as exc:
             return jsonify({"error": str(exc)}), 400
 
-        db = get_db()
-        cursor = db.execute(f"UPDATE students SET {subject} = ? WHERE id = ?", (score, student_id))
-        if cursor.rowcount == 0:
-            return jsonify({"error": "学生不存在"}), 404
-        db.commit()
-
-        row = db.execute(
-            f"SELECT id, name, chinese, math, english, physics, chemistry, biology, {TOTAL_EXPR} AS total FROM students WHERE id = ?",
-            (student_id,),
-        ).fetchone()
-        return jsonify({"message": "修改成功", "student": row_to_dict(row)})
+        result = current_write_coordinator().submit(
+            get_db(), {"op": "subject", "id": student_id, "subject": subject, "score": score}
+        )
+        if not result["ok"]:
+            return jsonify({"error": result["error"]}), result["status"]
+        return jsonify({"message": "修改成功", "student": result["student"]})
 
     @app.route("/api/students/<int:student_id>", methods=["DELETE"])
     def delete_student(student_id: int) -> Response:
+        result = current_write_coordinator().submit(get_db(), {"op": "delete", "id": student_id})
+        if not result["ok"]:
+            return jsonify({"error": result["error"]}), result["status"]
+        return jsonify({"message": "删除成功"})
+
+    @app.route("/api/students/batch", methods=["POST"])
+    def batch_students() -> Response:
+        payload = request.get_json(silent=True) or {}
+        items = payload.get("operations")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "operations 字段必须为非空数组"}), 400
+        if len(items) > BATCH_OPERATIONS_MAX:
+            return jsonify({"error": f"单次最多 {BATCH_OPERATIONS_MAX} 项操作"}), 400
+
+        operations: list[dict[str, Any] | ValueError] = []
+        for item in items:
+            try:
+                operations.append(parse_operation(item))
+            except ValueError as exc:
+                operations.append(exc)
+
+        results = apply_student_operations(get_db(), operations, atomic=bool(payload.get("atomic", False)))
+        applied = sum(1 for result in results if result["ok"])
+        return jsonify(
+            {
+                "message": f"成功执行 {applied} 项，失败 {len(results) - applied} 项",
+                "applied": applied,
+                "failed": len(results) - applied,
+                "results": results,
+            }
+        )
+
+    @app.route("/api/rank/students/<int:student_id>", methods=["GET"])
+    def student_rank(student_id: int) -> Response:
         db = get_db()
-        cursor = db.execute("DELETE FROM students WHERE id = ?", (student_id,))
-        if cursor.rowcount == 0:
+        row = db.execute(f"SELECT {STUDENT_COLUMNS} FROM students WHERE id = ?", (student_id,)).fetchone()
+        if row is None:
             return jsonify({"error": "学生不存在"}), 404
-        db.commit()
-        return jsonify({"message": "删除成功"})
+
+        rank_index = current_rank_index()
+        rank_index.refresh(db)
+        student = row_to_dict(row)
+        return jsonify(
+            {
+                "id": student["id"],
+                "name": student["name"],
+                "count": rank_index.trees["total"].total,
+                "ranks": {subject: rank_index.position(subject, student[subject]) for subject in RANK_SUBJECTS},
+            }
+        )
+
+    @app.route("/api/rank/score", methods=["GET"])
+    def score_rank() -> Response:
+        try:
+            subject = parse_rank_subject(request.args.get("subject"))
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+        score = request.args.get("score")
+        if score is None or parse_int(score, -1) < 0:
+            return jsonify({"error": "score 必须为非负整数"}), 400
+
+        rank_index = current_rank_index()
+        rank_index.refresh(get_db())
+        result = rank_index.position(subject, parse_int(score, 0))
+        return jsonify({"subject": subject, "count": rank_index.trees[subject].total, **result})
+
+    @app.route("/api/changes", methods=["GET"])
+    def list_changes() -> Response:
+        since_arg = request.args.get("since")
+        if since_arg is not None and parse_int(since_arg, -1) < 0:
+            return jsonify({"error": "since 必须为非负整数"}), 400
+        since = parse_int(since_arg, 0) if since_arg is not None else None
+        limit = clamp(parse_int(request.args.get("limit"), CHANGES_PAGE_SIZE), 1, CHANGES_PAGE_MAX)
+        return jsonify(fetch_changes(since, limit, request.args.get("epoch") or None))
+
+    @app.route("/api/rank/nth", methods=["GET"])
+    def nth_rank() -> Response:
+        try:
+            subject = parse_rank_subject(request.args.get("subject"))
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+        n = parse_int(request.args.get("n"), 0)
+
+        rank_index = current_rank_index()
+        rank_index.refresh(get_db())
+        score = rank_index.nth(subject, n)
+        if score is None:
+            return jsonify({"error": "名次超出范围"}), 404
+        return jsonify({"subject": subject, "n": n, "score": score, **rank_index.position(subject, score)})
 
     @app.route("/api/seed", methods=["POST"])
     def seed_students() -> Response:
@@ -574,43 +4099,73 @@ def create_app() -> Flask:
 
     @app.route("/api/stats", methods=["GET"])
     def stats() -> Response:
-        keyword = request.args.get("keyword", "").strip()
-        min_total = clamp(parse_int(request.args.get("min_total"), 0), 0, TOTAL_MAX)
-        max_total = clamp(parse_int(request.args.get("max_total"), TOTAL_MAX), 0, TOTAL_MAX)
-        if min_total > max_total:
-            min_total, max_total = max_total, min_total
+        keyword, min_total, max_total = parse_filter(request.args)
+        ranges = parse_subject_ranges(request.args)
+
+        exams_arg = request.args.get("exams")
+        if exams_arg is not None:
+            try:
+                exam_ids = parse_exam_list(exams_arg)
+            except ValueError as exc:
+                return jsonify({"error": str(exc)}), 400
+            missing = [exam_id for exam_id in exam_ids if find_exam(exam_id) is None]
+            if missing:
+                return jsonify({"error": f"考试不存在：{', '.join(missing)}"}), 404
+            return jsonify(build_cross_exam_stats(exam_ids, keyword, min_total, max_total, ranges))
+
+        series = request.args.get("series", "1")
+        include_series = series != "0"
+        point_budget = None
+        if series == "compact":
+            point_budget = clamp(parse_int(request.args.get("points"), SCATTER_POINTS_DEFAULT), 1, SCATTER_POINTS_MAX)
+        return cached_json_response(
+            ("stats", keyword, min_total, max_total, include_series, point_budget, ranges),
+            lambda: build_stats(
+                keyword=keyword,
+                min_total=min_total,
+                max_total=max_total,
+                include_series=include_series,
+                point_budget=point_budget,
+                ranges=ranges,
+            ),
+        )
+
+    @app.route("/api/dashboard", methods=["GET", "POST"])
+    def dashboard_data() -> Response:
+        if request.method == "GET":
+            filters = [parse_filter(request.args)]
+            page_size = clamp(parse_int(request.args.get("page_size"), DASHBOARD_PAGE_SIZE), 1, PAGE_SIZE_MAX)
+        else:
+            payload = request.get_json(silent=True) or {}
+            raw_filters = payload.get("filters")
+            if not isinstance(raw_filters, list) or not raw_filters:
+                return jsonify({"error": "filters 必须是非空数组"}), 400
+            if len(raw_filters) > DASHBOARD_FILTERS_MAX:
+                return jsonify({"error": f"最多支持 {DASHBOARD_FILTERS_MAX} 组筛选条件"}), 400
+            if not all(isinstance(item, dict) for item in raw_filters):
+                return jsonify({"error": "每组筛选条件必须是对象"}), 400
+            filters = [parse_filter(item) for item in raw_filters]
+            page_size = clamp(parse_int(payload.get("page_size"), DASHBOARD_PAGE_SIZE), 1, PAGE_SIZE_MAX)
+
+        def build() -> dict[str, Any]:
+            results = build_dashboard(filters, page_size)
+            return results[0] if request.method == "GET" else {"results": results}
 
-        result = build_stats(keyword=keyword, min_total=min_total, max_total=max_total)
-        return jsonify(result)
+        return cached_json_response(("dashboard", request.method, tuple(filters), page_size), build)
 
     @app.route("/api/export/csv", methods=["GET"])
     def export_csv() -> Response:
-        students = fetch_students()
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["排名", "姓名", "语文", "数学", "英语", "物理", "化学", "生物", "总分"])
-        for idx, s in enumerate(students, start=1):
-            writer.writerow([
-                idx,
-                s["name"],
-                s["chinese"],
-                s["math"],
-                s["english"],
-                s["physics"],
-                s["chemistry"],
-                s["biology"],
-                s["total"],
-            ])
-
-        csv_data = output.getvalue()
-        response = Response(csv_data, mimetype="text/csv; charset=utf-8")
-        response.headers["Content-Disposition"] = "attachment; filename=score_atlas_export.csv"
-        return response
+        return streamed_export(iter_csv_export(), "text/csv; charset=utf-8", "score_atlas_export.csv")
 
     @app.route("/api/export/json", methods=["GET"])
     def export_json() -> Response:
-        students = fetch_students()
-        return jsonify({"students": students, "count": len(students)})
+        if wants_columns():
+            return streamed_export(iter_columnar_json_export(), COLUMNAR_MIMETYPE, None)
+        return streamed_export(iter_json_export(), "application/json", None)
+
+    @app.route("/api/export/ndjson", methods=["GET"])
+    def export_ndjson() -> Response:
+        return streamed_export(iter_ndjson_export(), "application/x-ndjson", "score_atlas_export.ndjson")
 
     @app.route("/api/import/json", methods=["POST"])
     def import_json() -> Response:
@@ -633,6 +4188,8 @@ def create_app() -> Flask:
                 return jsonify({"error": f"第 {idx} 条记录姓名重复：{cleaned['name']}"}), 400
             names_seen.add(cleaned["name"])
             cleaned_list.append(cleaned)
+        if replace and not cleaned_list:
+            return jsonify({"error": "替换导入没有可用的记录，原有数据未改动"}), 400
 
         db = get_db()
         try:
@@ -651,10 +4208,55 @@ def create_app() -> Flask:
 
         return jsonify({"message": f"成功导入 {len(cleaned_list)} 条数据"})
 
+    @app.route("/api/import/stream", methods=["POST"])
+    def import_stream() -> Response:
+        mode = request.args.get("mode", "append")
+        if mode not in IMPORT_MODES:
+            return jsonify({"error": "mode 必须为 append / replace / upsert"}), 400
+
+        fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+        if fmt not in ("csv", "ndjson"):
+            return jsonify({"error": "format 必须为 csv 或 ndjson"}), 400
+
+        batch_size = clamp(parse_int(request.args.get("batch_size"), IMPORT_BATCH_SIZE), 1, IMPORT_BATCH_MAX)
+        stream = io.TextIOWrapper(request.stream, encoding="utf-8-sig", newline="")
+        records = iter_csv_records(stream) if fmt == "csv" else iter_ndjson_records(stream)
+        try:
+            report = ingest_students(records, mode=mode, batch_size=batch_size)
+        except (UnicodeDecodeError, csv.Error) as exc:
+            return jsonify({"error": f"导入中断：{exc}"}), 400
+        if "error" in report:
+            return jsonify(report), 400
+
+        accepted = report["inserted"] + report["updated"]
+        report["message"] = f"成功导入 {accepted} 条数据，拒绝 {report['rejected']} 条"
+        return jsonify(report)
+
+    # Every data endpoint is also served per exam, e.g. /api/exams/<id>/students
+    # (the same as /api/students?exam=<id>); unprefixed routes use the default database.
+    for rule in list(app.url_map.iter_rules()):
+        if rule.rule.startswith("/api/") and not rule.rule.startswith(EXAM_UNSCOPED_ROUTES):
+            app.add_url_rule(
+                f"/api/exams/<exam_id>{rule.rule[len('/api'):]}",
+                rule.endpoint,
+                methods=sorted(rule.methods - {"HEAD", "OPTIONS"}),
+            )
+
+    if WARMUP_ENABLED:
+        with startup_phase("warmup"):
+            warm_up(app)
+    startup_timings["createApp"] = round((time.perf_counter() - started) * 1000, 3)
+    if WARMUP_ENABLED:
+        phases = ", ".join(f"{name} {ms:.1f}" for name, ms in startup_timings.items() if name != "createApp")
+        click.echo(f"scoreatlas: app ready in {startup_timings['createApp']:.1f} ms ({phases})", err=True)
+
     return app
 
 
-app = create_app()
+# Partition pool processes import this module only to run partial_aggregate,
+# either by name or as __mp_main__ under `python app.py`; they must not build
+# an app (schema checks, warm-up, background threads).
+app = create_app() if __name__ != "__mp_main__" and multiprocessing.parent_process() is None else None
 
 
 if __name__ == "__main__":
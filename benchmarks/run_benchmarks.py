@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scratch import use_scratch_data_dir  # noqa: E402
+
+SCRATCH_DIR = use_scratch_data_dir("scoreatlas-bench-")
+
+import app as scoreatlas  # noqa: E402
+
+FIXTURE_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+DEFAULT_SIZES = "1000,100000"
+DEFAULT_SEED = 20240601
+DEFAULT_REPEAT = 30
+DEFAULT_CASE_SECONDS = 10.0
+MIN_ITERATIONS = 3
+
+scoreatlas_app: Any = None
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[], Any]
+    setup: Callable[[], None] | None = None
+    counts_items: bool = False
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    index = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def build_fixture(size: int, seed: int) -> str:
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = os.path.join(FIXTURE_DIR, f"students-{size}-{seed}.db")
+    if os.path.exists(path):
+        return path
+
+    building = f"{path}.building"
+    remove_database(building)
+    scoreatlas.DB_PATH = building
+    started = time.perf_counter()
+    flask_app = scoreatlas.create_app()
+    with flask_app.app_context():
+        scoreatlas.bulk_load_students(scoreatlas.generate_cohort(size, seed))
+        db = scoreatlas.get_db()
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    os.replace(building, path)
+    remove_database(building)
+    print(f"built fixture {os.path.relpath(path, ROOT)} in {time.perf_counter() - started:.1f}s", flush=True)
+    return path
+
+
+def remove_database(path: str) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def count_queries(case: Case) -> int:
+    statements: list[str] = []
+
+    def trace(sql: str) -> None:
+        # Trigger steps are reported again with the text of the statement that
+        # fired them, and FTS5 shadow-table writes as "-- ..." comments.
+        if not sql.startswith("--") and (not statements or statements[-1] != sql):
+            statements.append(sql)
+
+    db = scoreatlas.get_db()
+    db.set_trace_callback(trace)
+    try:
+        if case.setup:
+            case.setup()
+        statements.clear()
+        case.run()
+    finally:
+        db.set_trace_callback(None)
+    return len(statements)
+
+
+def peak_memory(case: Case) -> int:
+    if case.setup:
+        case.setup()
+    tracemalloc.start()
+    try:
+        case.run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(case: Case, repeat: int, case_seconds: float) -> dict[str, Any]:
+    if case.setup:
+        case.setup()
+    case.run()
+
+    timings: list[float] = []
+    items = 0
+    spent = 0.0
+    while len(timings) < repeat and (len(timings) < MIN_ITERATIONS or spent < case_seconds):
+        if case.setup:
+            case.setup()
+        started = time.perf_counter()
+        produced = case.run()
+        elapsed = time.perf_counter() - started
+        timings.append(elapsed)
+        spent += elapsed
+        if case.counts_items:
+            items += produced
+
+    ordered = sorted(timings)
+    result = {
+        "iterations": len(timings),
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p90_ms": round(percentile(ordered, 90) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "ops_per_sec": round(len(timings) / spent, 2),
+        "peak_memory_kib": round(peak_memory(case) / 1024, 1),
+        "queries": count_queries(case),
+    }
+    if items:
+        result["items_per_sec"] = round(items / spent, 1)
+    return result
+
+
+def direct_cases() -> list[Case]:
+    db = scoreatlas.get_db()
+    upsert_rows = [
+        dict(row)
+        for row in db.execute(f"SELECT name, {', '.join(scoreatlas.SUBJECT_CODES)} FROM students ORDER BY id LIMIT 1000")
+    ]
+
+    def ingest() -> int:
+        records = ((line_no, record) for line_no, record in enumerate(upsert_rows, start=1))
+        report = scoreatlas.ingest_students(records, "upsert")
+        return report["updated"] + report["inserted"]
+
+    return [
+        Case("fetch_students.top100", lambda: len(scoreatlas.fetch_students(limit=100)), counts_items=True),
+        Case("fetch_students.keyword_like", lambda: len(scoreatlas.fetch_students(keyword="子宇", limit=100)), counts_items=True),
+        Case("fetch_students.keyword_fts", lambda: len(scoreatlas.fetch_students(keyword="王子宇", limit=100)), counts_items=True),
+        Case("fetch_student_page.first", lambda: len(scoreatlas.fetch_student_page(page_size=100)["students"]), counts_items=True),
+        Case("count_students.range", lambda: scoreatlas.count_students(min_total=600)),
+        Case("build_stats.full", lambda: scoreatlas.build_stats()),
+        Case("build_stats.summary", lambda: scoreatlas.build_stats(include_series=False)),
+        Case("build_stats.filtered", lambda: scoreatlas.build_stats(min_total=600)),
+        Case("iter_csv_export", lambda: sum(len(chunk) for chunk in scoreatlas.iter_csv_export()), counts_items=True),
+        Case("ingest_students.upsert1000", ingest, counts_items=True),
+    ]
+
+
+def endpoint_cases() -> list[Case]:
+    client = scoreatlas_app.test_client()
+    db = scoreatlas.get_db()
+    target_id = db.execute("SELECT id FROM students ORDER BY id LIMIT 1").fetchone()[0]
+    batch_ids = [row[0] for row in db.execute("SELECT id FROM students ORDER BY id LIMIT 100")]
+    state = {"toggle": 0, "imports": 0}
+
+    def clear_cache() -> None:
+        scoreatlas.response_cache.entries.clear()
+        scoreatlas.response_cache.size = 0
+
+    def get(url: str) -> Callable[[], int]:
+        def run() -> int:
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            return len(response.get_data())
+
+        return run
+
+    def dashboard_compare() -> int:
+        filters = [{"min_total": 600}, {"min_total": 450, "max_total": 599}, {"keyword": "王"}, {"keyword": "李", "min_total": 500}]
+        response = client.post("/api/dashboard", json={"filters": filters})
+        assert response.status_code == 200, response.get_json()
+        return len(response.get_data())
+
+    def patch_subject() -> None:
+        state["toggle"] ^= 1
+        response = client.patch(
+            f"/api/students/{target_id}/subject",
+            json={"subject": "math", "score": 100 + state["toggle"]},
+        )
+        assert response.status_code == 200, response.get_json()
+
+    def import_json() -> None:
+        state["imports"] += 1
+        students = [
+            {"name": f"压测{state['imports']}-{i}", "chinese": 100, "math": 100, "english": 100,
+             "physics": 70, "chemistry": 70, "biology": 70}
+            for i in range(200)
+        ]
+        response = client.post("/api/import/json", json={"replace": False, "students": students})
+        assert response.status_code == 200, response.get_json()
+
+    def batch_subject() -> None:
+        state["toggle"] ^= 1
+        operations = [
+            {"op": "subject", "id": student_id, "subject": "english", "score": 110 + state["toggle"]}
+            for student_id in batch_ids
+        ]
+        response = client.post("/api/students/batch", json={"operations": operations})
+        assert response.status_code == 200, response.get_json()
+
+    return [
+        Case("GET /api/students?limit=100", get("/api/students?limit=100"), clear_cache),
+        Case("GET /api/students?page_size=100&with_count=1", get("/api/students?page_size=100&with_count=1"), clear_cache),
+        Case("GET /api/students?keyword=王子宇&limit=100", get("/api/students?keyword=王子宇&limit=100"), clear_cache),
+        Case("GET /api/stats", get("/api/stats"), clear_cache),
+        Case("GET /api/stats (cached)", get("/api/stats")),
+        Case("GET /api/stats?series=0", get("/api/stats?series=0"), clear_cache),
+        Case("GET /api/stats?series=compact", get("/api/stats?series=compact"), clear_cache),
+        Case("GET /api/stats?min_total=600", get("/api/stats?min_total=600"), clear_cache),
+        Case(
+            "GET /api/students?math_min=130&physics_max=59&sort=chemistry&limit=100",
+            get("/api/students?math_min=130&physics_max=59&sort=chemistry&limit=100"),
+            clear_cache,
+        ),
+        Case("GET /api/stats?series=0&math_min=130&physics_max=59", get("/api/stats?series=0&math_min=130&physics_max=59"), clear_cache),
+        Case("GET /api/dashboard?min_total=600", get("/api/dashboard?min_total=600"), clear_cache),
+        Case("POST /api/dashboard (4 filter sets)", dashboard_compare, clear_cache),
+        Case("GET /api/export/csv", get("/api/export/csv")),
+        Case("PATCH /api/students/<id>/subject", patch_subject),
+        Case("POST /api/students/batch (100 ops)", batch_subject),
+        Case("POST /api/import/json (200 rows)", import_json),
+    ]
+
+
+def run_size(size: int, args: argparse.Namespace) -> dict[str, Any]:
+    global scoreatlas_app
+    fixture = build_fixture(size, args.seed)
+    work = os.path.join(SCRATCH_DIR, f"work-{size}.db")
+    remove_database(work)
+    shutil.copyfile(fixture, work)
+    scoreatlas.DB_PATH = work
+    scoreatlas_app = scoreatlas.create_app()
+
+    results: dict[str, Any] = {}
+    try:
+        with scoreatlas_app.app_context():
+            for case in direct_cases() + endpoint_cases():
+                if args.filter and args.filter not in case.name:
+                    continue
+                result = measure(case, args.repeat, args.case_seconds)
+                results[case.name] = result
+                print(
+                    f"{size:>9} {case.name:<46} p50 {result['p50_ms']:>10.3f}ms "
+                    f"p99 {result['p99_ms']:>10.3f}ms {result['ops_per_sec']:>10.1f}/s "
+                    f"peak {result['peak_memory_kib']:>10.1f}KiB q {result['queries']}",
+                    flush=True,
+                )
+    finally:
+        remove_database(work)
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    regressions = []
+    print(f"\ncompared with {baseline['meta'].get('revision')} (p50, threshold {threshold:.0%})")
+    for size, cases in current["results"].items():
+        for name, result in cases.items():
+            previous = baseline["results"].get(size, {}).get(name)
+            if not previous:
+                continue
+            ratio = result["p50_ms"] / previous["p50_ms"] if previous["p50_ms"] else 1.0
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{size} {name}")
+            elif ratio < 1 - threshold:
+                flag = "  faster"
+            print(f"{size:>9} {name:<46} {previous['p50_ms']:>10.3f} -> {result['p50_ms']:>10.3f}ms ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ScoreAtlas data paths against fixture databases.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated fixture sizes, e.g. 1000,100000,1000000.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed for the generated fixtures.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed iterations per case.")
+    parser.add_argument(
+        "--case-seconds",
+        type=float,
+        default=DEFAULT_CASE_SECONDS,
+        help=f"Stop a case early once it has run this long (after {MIN_ITERATIONS} iterations).",
+    )
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text.")
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative p50 slowdown reported as a regression.")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    report: dict[str, Any] = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "numpy": scoreatlas.load_numpy().__version__ if scoreatlas.load_numpy() is not None else None,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    try:
+        for size in sizes:
+            report["results"][str(size)] = run_size(size, args)
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"\nwrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,21 +28,59 @@ const mockData = {
   ],
 };
 
-async function fetchStats() {
+const SNAPSHOT_BASE = "./data";
+const TOP_STUDENTS = 100;
+
+async function fetchJson(url, options) {
+  const response = await fetch(url, options);
+  if (!response.ok) throw new Error(`HTTP ${response.status}`);
+  return response.json();
+}
+
+async function fetchSnapshot() {
+  // manifest.json is revalidated on every visit; the files it names are content-hashed.
+  const response = await fetch(`${SNAPSHOT_BASE}/manifest.json`, { cache: "no-cache" });
+  // No snapshot published: the caller reads the live API instead.
+  if (response.status === 404) return null;
+  if (!response.ok) throw new Error(`HTTP ${response.status}`);
+  const manifest = await response.json();
+  const [stats, list] = await Promise.all([
+    fetchJson(`${SNAPSHOT_BASE}/${manifest.stats}`),
+    fetchJson(`${SNAPSHOT_BASE}/${manifest.students}`),
+  ]);
+  setState("ok", "静态快照", `数据版本 ${manifest.version}`);
+  return { stats, students: list.students };
+}
+
+async function fetchData() {
+  let snapshotError = null;
+  try {
+    const snapshot = await fetchSnapshot();
+    if (snapshot) return snapshot;
+  } catch (error) {
+    // A published snapshot that fails to load is reported, not hidden.
+    snapshotError = error;
+  }
+
   if (!API_BASE) {
-    setState("mock", "演示模式", "未配置 API_BASE，展示内置示例数据");
-    return mockData;
+    if (snapshotError) {
+      setState("err", "快照加载失败，已切换示例数据", snapshotError.message);
+    } else {
+      setState("mock", "演示模式", "未配置 API_BASE，展示内置示例数据");
+    }
+    return { stats: mockData, students: [] };
   }
 
   try {
-    const response = await fetch(`${API_BASE}/api/stats`);
-    if (!response.ok) throw new Error(`HTTP ${response.status}`);
-    const data = await response.json();
+    const [stats, list] = await Promise.all([
+      fetchJson(`${API_BASE}/api/stats?series=0`),
+      fetchJson(`${API_BASE}/api/students?page_size=${TOP_STUDENTS}`),
+    ]);
     setState("ok", "已连接后端", API_BASE);
-    return data;
+    return { stats, students: list.students };
   } catch (error) {
     setState("err", "连接失败，已切换示例数据", `${API_BASE} · ${error.message}`);
-    return mockData;
+    return { stats: mockData, students: [] };
   }
 }
 
@@ -129,11 +167,29 @@ function renderAvg(subjectAverages) {
   });
 }
 
+function renderRanking(students) {
+  const body = document.getElementById("rank-body");
+  const rows = students.slice(0, TOP_STUDENTS);
+  if (!rows.length) {
+    body.innerHTML = '<tr><td colspan="9" class="empty">暂无数据</td></tr>';
+    return;
+  }
+  const cell = (value) => `<td>${String(value).replace(/[&<>"]/g, (c) => `&#${c.charCodeAt(0)};`)}</td>`;
+  body.innerHTML = rows
+    .map((s, index) =>
+      `<tr>${[index + 1, s.name, s.total, s.chinese, s.math, s.english, s.physics, s.chemistry, s.biology]
+        .map(cell)
+        .join("")}</tr>`
+    )
+    .join("");
+}
+
 async function init() {
-  const stats = await fetchStats();
+  const { stats, students } = await fetchData();
   renderMetrics(stats);
   renderHist(stats.histogram || []);
   renderAvg(stats.subjectAverages || []);
+  renderRanking(students || []);
 
   window.addEventListener("resize", () => {
     histChart && histChart.resize();
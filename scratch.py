@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+DATA_PATH_VARS = {
+    "SCOREATLAS_DB_PATH": "scores.db",
+    "SCOREATLAS_COLUMN_STORE_DIR": "columns",
+    "SCOREATLAS_METRICS_DIR": "metrics",
+    "SCOREATLAS_EXAMS_DIR": "exams",
+}
+
+
+def use_scratch_data_dir(prefix: str) -> str:
+    # app reads these at import time and runs create_app() against them, so
+    # call this before `import app`. Every data path then lives in a fresh
+    # temporary directory and nothing is written into data/.
+    directory = tempfile.mkdtemp(prefix=prefix)
+    for var, name in DATA_PATH_VARS.items():
+        os.environ[var] = os.path.join(directory, name)
+    return directory
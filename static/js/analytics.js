@@ -55,12 +55,15 @@ function renderRadar(subjectAverages) {
   });
 }
 
-function renderBoxplot(subjectSeries) {
+function renderBoxplot(subjectBoxes, subjectSeries) {
   const dom = document.getElementById("boxplot-chart");
   boxplotChart = boxplotChart || echarts.init(dom);
 
-  const labels = Object.keys(subjectSeries || {});
-  const boxData = labels.map((label) => toBoxData(subjectSeries[label] || []));
+  const precomputed = Object.keys(subjectBoxes || {}).length > 0;
+  const labels = Object.keys(precomputed ? subjectBoxes : subjectSeries || {});
+  const boxData = labels.map((label) => (
+    precomputed ? subjectBoxes[label] : toBoxData(subjectSeries[label] || [])
+  ));
 
   boxplotChart.setOption({
     tooltip: { trigger: "item" },
@@ -95,11 +98,18 @@ function renderScatter(scatterData) {
   const dom = document.getElementById("scatter-chart");
   scatterChart = scatterChart || echarts.init(dom);
 
+  // Large cohorts come back density-binned: each point is a cell centroid with a count.
+  const binned = scatterData.some((s) => s.count !== undefined);
+  const maxCount = binned ? Math.max(...scatterData.map((s) => s.count)) : 1;
+
   scatterChart.setOption({
     grid: { left: 52, right: 60, top: 30, bottom: 46 },
     tooltip: {
       formatter: (params) => {
-        const [x, y, english, name] = params.data;
+        const [x, y, english, name, count] = params.data;
+        if (binned) {
+          return `${count} 名学生<br/>数学均分：${x}<br/>总分均值：${y}<br/>英语均分：${english}`;
+        }
         return `${name}<br/>数学：${x}<br/>总分：${y}<br/>英语：${english}`;
       },
     },
@@ -134,8 +144,8 @@ function renderScatter(scatterData) {
     series: [
       {
         type: "scatter",
-        symbolSize: 13,
-        data: scatterData.map((s) => [s.math, s.total, s.english, s.name]),
+        symbolSize: binned ? (data) => 6 + 14 * Math.sqrt(data[4] / maxCount) : 13,
+        data: scatterData.map((s) => [s.math, s.total, s.english, s.name || "", s.count || 1]),
       },
     ],
   });
@@ -196,9 +206,9 @@ function renderHeatmap(correlations) {
 
 async function loadAnalytics() {
   try {
-    const stats = await requestApi("/api/stats");
+    const stats = await requestApi("/api/stats?series=compact");
     renderRadar(stats.subjectAverages || []);
-    renderBoxplot(stats.subjectSeries || {});
+    renderBoxplot(stats.subjectBoxes || {}, stats.subjectSeries || {});
     renderScatter(stats.scatter || []);
     renderHeatmap(stats.correlations || []);
   } catch (err) {
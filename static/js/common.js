@@ -80,7 +80,8 @@ function buildTableRow(student, index, withAction = false) {
 
   let html = `<tr>${cells.map((v) => `<td>${v}</td>`).join("")}`;
   if (withAction) {
-    html += `<td><button class="btn btn-danger btn-small js-delete" data-id="${student.id}" data-name="${student.name}">删除</button></td>`;
+    html += `<td class="action-cell"><input type="checkbox" class="js-select" data-id="${student.id}" />`
+      + `<button class="btn btn-danger btn-small js-delete" data-id="${student.id}" data-name="${student.name}">删除</button></td>`;
   }
   html += "</tr>";
   return html;
@@ -1,3 +1,5 @@
+const DASHBOARD_PAGE_SIZE = 1000;
+
 let histogramChart;
 let segmentChart;
 let subjectAvgChart;
@@ -11,17 +13,14 @@ async function loadDashboard() {
     keyword,
     min_total: String(Math.max(0, Math.min(minTotal, 750))),
     max_total: String(Math.max(0, Math.min(maxTotal, 750))),
+    page_size: String(DASHBOARD_PAGE_SIZE),
   });
 
   try {
-    const [studentRes, stats] = await Promise.all([
-      requestApi(`/api/students?${params.toString()}`),
-      requestApi(`/api/stats?${params.toString()}`),
-    ]);
-
-    const students = studentRes.students || [];
+    const res = await requestApi(`/api/dashboard?${params.toString()}`);
+    const stats = res.stats || {};
     renderMetrics(stats);
-    renderScoreTable(students);
+    renderScoreTable(res.students || [], res.total ?? 0);
     renderHistogram(stats.histogram || []);
     renderSegments(stats.segments || []);
     renderSubjectAverages(stats.subjectAverages || []);
@@ -38,7 +37,7 @@ function renderMetrics(stats) {
   document.getElementById("metric-qualified").textContent = toPercent(stats.qualifiedRate || 0);
 }
 
-function renderScoreTable(students) {
+function renderScoreTable(students, total) {
   const body = document.getElementById("score-table-body");
   const countTag = document.getElementById("table-count");
   if (!students.length) {
@@ -48,7 +47,7 @@ function renderScoreTable(students) {
   }
 
   body.innerHTML = students.map((s, idx) => buildTableRow(s, idx, false)).join("");
-  countTag.textContent = `${students.length} 条`;
+  countTag.textContent = students.length < total ? `${students.length} / ${total} 条` : `${students.length} 条`;
 }
 
 function renderHistogram(histogram) {
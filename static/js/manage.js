@@ -1,9 +1,98 @@
+const MANAGE_PAGE_SIZE = 200;
+const CHANGES_PAGE_SIZE = 500;
+
 let allStudents = [];
+let totalStudents = 0;
+let nextCursor = null;
+let changeVersion = null;
+let changeEpoch = null;
+
+async function fetchManagePage(cursor) {
+  const params = new URLSearchParams({ page_size: String(MANAGE_PAGE_SIZE), with_count: "1" });
+  if (cursor) {
+    params.set("cursor", cursor);
+  }
+  return requestApi(`/api/students?${params.toString()}`);
+}
 
 async function loadManageData() {
   try {
-    const res = await requestApi("/api/students");
+    // Take the change feed head first; changes racing the page load are replayed harmlessly.
+    const head = await requestApi("/api/changes");
+    const res = await fetchManagePage(null);
     allStudents = res.students || [];
+    totalStudents = res.total ?? allStudents.length;
+    nextCursor = res.next || null;
+    changeVersion = head.version;
+    changeEpoch = head.epoch;
+    renderManageTable(allStudents);
+    hydrateStudentSelects(allStudents);
+  } catch (err) {
+    showToast(err.message, "error");
+  }
+}
+
+async function syncManageData() {
+  if (changeVersion === null) {
+    loadManageData();
+    return;
+  }
+
+  try {
+    const params = new URLSearchParams({
+      since: String(changeVersion),
+      epoch: changeEpoch,
+      limit: String(CHANGES_PAGE_SIZE),
+    });
+    const feed = await requestApi(`/api/changes?${params.toString()}`);
+    if (feed.reset || feed.more) {
+      // A new epoch, or a backlog bigger than one page, is cheaper to reload.
+      loadManageData();
+      return;
+    }
+    applyChanges(feed.changes || []);
+    changeVersion = feed.version;
+    totalStudents = feed.count;
+    renderManageTable(allStudents);
+    hydrateStudentSelects(allStudents);
+  } catch (err) {
+    showToast(err.message, "error");
+  }
+}
+
+function compareRank(a, b) {
+  return b.total - a.total || b.chinese - a.chinese || b.math - a.math || b.english - a.english || a.id - b.id;
+}
+
+function decodeCursor(cursor) {
+  const [total, chinese, math, english, id] = JSON.parse(atob(cursor.replace(/-/g, "+").replace(/_/g, "/")));
+  return { total, chinese, math, english, id };
+}
+
+function applyChanges(changes) {
+  const byId = new Map(allStudents.map((s) => [s.id, s]));
+  for (const change of changes) {
+    byId.delete(change.id);
+    if (change.op === "upsert") {
+      byId.set(change.id, change.student);
+    }
+  }
+
+  // Rows ranked after the page cursor belong to pages that are not loaded yet.
+  const boundary = nextCursor ? decodeCursor(nextCursor) : null;
+  allStudents = [...byId.values()]
+    .filter((s) => !boundary || compareRank(s, boundary) <= 0)
+    .sort(compareRank);
+}
+
+async function loadMoreStudents() {
+  if (!nextCursor) return;
+
+  try {
+    const res = await fetchManagePage(nextCursor);
+    allStudents = allStudents.concat(res.students || []);
+    totalStudents = res.total ?? totalStudents;
+    nextCursor = res.next || null;
     renderManageTable(allStudents);
     hydrateStudentSelects(allStudents);
   } catch (err) {
@@ -14,6 +103,8 @@ async function loadManageData() {
 function renderManageTable(students) {
   const body = document.getElementById("manage-table-body");
   const countTag = document.getElementById("manage-count");
+  const loadMoreBtn = document.getElementById("load-more-btn");
+  loadMoreBtn.hidden = !nextCursor;
 
   if (!students.length) {
     body.innerHTML = '<tr><td class="empty-row" colspan="10">暂无数据</td></tr>';
@@ -22,7 +113,9 @@ function renderManageTable(students) {
   }
 
   body.innerHTML = students.map((s, idx) => buildTableRow(s, idx, true)).join("");
-  countTag.textContent = `${students.length} 条`;
+  countTag.textContent = students.length < totalStudents
+    ? `${students.length} / ${totalStudents} 条`
+    : `${students.length} 条`;
 }
 
 function hydrateStudentSelects(students) {
@@ -57,7 +150,7 @@ async function handleAdd(event) {
     });
     showToast("新增成功", "success");
     form.reset();
-    loadManageData();
+    syncManageData();
   } catch (err) {
     showToast(err.message, "error");
   }
@@ -85,7 +178,7 @@ async function handlePatch(event) {
       body: JSON.stringify({ subject, score }),
     });
     showToast("修改成功", "success");
-    loadManageData();
+    syncManageData();
   } catch (err) {
     showToast(err.message, "error");
   }
@@ -110,7 +203,7 @@ async function handleDelete(event) {
     await requestApi(`/api/students/${studentId}`, { method: "DELETE" });
     showToast("删除成功", "success");
     document.getElementById("delete-confirm").checked = false;
-    loadManageData();
+    syncManageData();
   } catch (err) {
     showToast(err.message, "error");
   }
@@ -133,7 +226,7 @@ async function handleSeed() {
       body: JSON.stringify({ count }),
     });
     showToast(res.message || "重置成功", "success");
-    loadManageData();
+    syncManageData();
   } catch (err) {
     showToast(err.message, "error");
   }
@@ -142,11 +235,18 @@ async function handleSeed() {
 async function handleImport() {
   const input = document.getElementById("import-file");
   if (!input.files || !input.files.length) {
-    showToast("请先选择 JSON 文件", "error");
+    showToast("请先选择 JSON / CSV / NDJSON 文件", "error");
     return;
   }
 
   const file = input.files[0];
+  const lowerName = file.name.toLowerCase();
+  if (lowerName.endsWith(".csv") || lowerName.endsWith(".ndjson")) {
+    await handleStreamImport(file, lowerName.endsWith(".csv") ? "csv" : "ndjson");
+    input.value = "";
+    return;
+  }
+
   try {
     const text = await file.text();
     const parsed = JSON.parse(text);
@@ -167,7 +267,47 @@ async function handleImport() {
 
     showToast(`导入成功，共 ${students.length} 条`, "success");
     input.value = "";
-    loadManageData();
+    syncManageData();
+  } catch (err) {
+    showToast(err.message, "error");
+  }
+}
+
+async function handleStreamImport(file, format) {
+  const mode = document.getElementById("import-mode").value;
+  try {
+    const report = await requestApi(`/api/import/stream?format=${format}&mode=${mode}`, {
+      method: "POST",
+      headers: { "Content-Type": format === "csv" ? "text/csv" : "application/x-ndjson" },
+      body: file,
+    });
+    showToast(report.message || "导入完成", report.rejected ? "info" : "success");
+    if (report.errors && report.errors.length) {
+      const first = report.errors[0];
+      showToast(`第 ${first.line} 行：${first.error}`, "error");
+    }
+    syncManageData();
+  } catch (err) {
+    showToast(err.message, "error");
+  }
+}
+
+async function handleBatchDelete() {
+  const selected = [...document.querySelectorAll(".js-select:checked")].map((el) => Number(el.dataset.id));
+  if (!selected.length) {
+    showToast("请先勾选要删除的学生", "error");
+    return;
+  }
+
+  if (!confirm(`确认删除选中的 ${selected.length} 名学生？`)) return;
+
+  try {
+    const res = await requestApi("/api/students/batch", {
+      method: "POST",
+      body: JSON.stringify({ operations: selected.map((id) => ({ op: "delete", id })) }),
+    });
+    showToast(res.message || "删除完成", res.failed ? "info" : "success");
+    syncManageData();
   } catch (err) {
     showToast(err.message, "error");
   }
@@ -180,6 +320,8 @@ function bindManageEvents() {
 
   document.getElementById("seed-btn").addEventListener("click", handleSeed);
   document.getElementById("import-btn").addEventListener("click", handleImport);
+  document.getElementById("load-more-btn").addEventListener("click", loadMoreStudents);
+  document.getElementById("batch-delete-btn").addEventListener("click", handleBatchDelete);
 
   document.getElementById("manage-table-body").addEventListener("click", async (event) => {
     const btn = event.target.closest(".js-delete");
@@ -192,7 +334,7 @@ function bindManageEvents() {
     try {
       await requestApi(`/api/students/${id}`, { method: "DELETE" });
       showToast("删除成功", "success");
-      loadManageData();
+      syncManageData();
     } catch (err) {
       showToast(err.message, "error");
     }
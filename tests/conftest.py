@@ -0,0 +1,59 @@
+import os
+import random
+import shutil
+import sys
+from typing import Any, Callable
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scratch import use_scratch_data_dir  # noqa: E402
+
+SCRATCH_DIR = use_scratch_data_dir("scoreatlas-tests-")
+
+import app as scoreatlas  # noqa: E402
+
+
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+def make_students(count: int, seed: int, prefix: str = "s") -> list[dict[str, Any]]:
+    # Narrow score ranges so totals and per-subject scores tie often; ties are
+    # where ordering and ranking bugs show up.
+    rand = random.Random(seed)
+    return [
+        {
+            "name": f"{prefix}{index:04d}",
+            **{code: rand.randint(maximum // 2, maximum // 2 + 8) for code, maximum in scoreatlas.SUBJECT_MAX.items()},
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def client() -> Any:
+    return scoreatlas.app.test_client()
+
+
+@pytest.fixture
+def load(client: Any) -> Callable[..., list[dict[str, Any]]]:
+    def load(students: list[dict[str, Any]], exam: str | None = None) -> list[dict[str, Any]]:
+        prefix = f"/api/exams/{exam}" if exam else "/api"
+        response = client.post(f"{prefix}/import/json", json={"replace": True, "students": students})
+        assert response.status_code == 200, response.get_json()
+        return client.get(f"{prefix}/students").get_json()["students"]
+
+    return load
+
+
+@pytest.fixture
+def create_exam(client: Any) -> Callable[[str], str]:
+    def create_exam(exam_id: str) -> str:
+        response = client.post("/api/exams", json={"id": exam_id, "name": exam_id})
+        assert response.status_code == 201, response.get_json()
+        return exam_id
+
+    return create_exam
@@ -0,0 +1,18 @@
+import json
+
+from conftest import make_students, scoreatlas
+
+
+def test_aggregates_stay_consistent_through_writes(client, load):
+    students = load(make_students(60, seed=31))
+    client.post("/api/students", json=make_students(1, seed=32, prefix="new")[0])
+    client.patch(f"/api/students/{students[0]['id']}/subject", json={"subject": "biology", "score": 0})
+    client.delete(f"/api/students/{students[1]['id']}")
+    lowered = {**students[2], **{code: 1 for code in scoreatlas.SUBJECT_CODES}}
+    client.post("/api/import/stream?mode=upsert&format=ndjson", data=json.dumps(lowered) + "\n")
+
+    with scoreatlas.app.app_context():
+        assert scoreatlas.check_aggregates(repair=False)
+    stats = client.get("/api/stats?series=0").get_json()
+    assert stats["count"] == 60
+    assert stats["top10"] == client.get("/api/students?limit=10").get_json()["students"]
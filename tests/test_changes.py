@@ -0,0 +1,91 @@
+import json
+from typing import Any
+
+from conftest import make_students, scoreatlas
+
+
+def replay(client: Any, mirror: dict[int, dict[str, Any]], since: int, epoch: str) -> int:
+    while True:
+        feed = client.get(f"/api/changes?since={since}&epoch={epoch}&limit=3").get_json()
+        assert not feed["reset"]
+        for change in feed["changes"]:
+            if change["op"] == "delete":
+                mirror.pop(change["id"], None)
+            else:
+                mirror[change["id"]] = change["student"]
+        since = feed["version"]
+        if not feed["more"]:
+            return since
+
+
+def table(client: Any) -> dict[int, dict[str, Any]]:
+    return {student["id"]: student for student in client.get("/api/students").get_json()["students"]}
+
+
+def test_replaying_changes_reproduces_the_table(client, load):
+    load(make_students(30, seed=11))
+    head = client.get("/api/changes").get_json()
+    mirror = table(client)
+    ids = sorted(mirror)
+
+    added = client.post("/api/students", json=make_students(1, seed=12, prefix="late")[0]).get_json()["student"]
+    client.patch(f"/api/students/{ids[0]}/subject", json={"subject": "math", "score": 1})
+    client.patch(f"/api/students/{added['id']}/subject", json={"subject": "english", "score": 2})
+    client.delete(f"/api/students/{ids[1]}")
+    client.delete(f"/api/students/{added['id']}")
+    batch = client.post(
+        "/api/students/batch",
+        json={
+            "operations": [
+                {"op": "insert", **make_students(1, seed=13, prefix="batch")[0]},
+                {"op": "subject", "id": ids[2], "subject": "physics", "score": 3},
+                {"op": "delete", "id": ids[3]},
+            ]
+        },
+    )
+    assert batch.get_json()["applied"] == 3
+    upsert = [{**mirror[ids[4]], "chinese": 4}, *make_students(2, seed=14, prefix="upsert")]
+    body = "".join(json.dumps(student) + "\n" for student in upsert)
+    assert client.post("/api/import/stream?mode=upsert&format=ndjson", data=body).status_code == 200
+
+    version = replay(client, mirror, head["version"], head["epoch"])
+    assert mirror == table(client)
+
+    # Caught up: the next poll is empty and keeps the version.
+    feed = client.get(f"/api/changes?since={version}&epoch={head['epoch']}").get_json()
+    assert (feed["changes"], feed["version"], feed["reset"]) == ([], version, False)
+    assert feed["count"] == len(mirror)
+
+
+def test_foreign_or_future_versions_reset(client, load):
+    load(make_students(5, seed=15))
+    head = client.get("/api/changes").get_json()
+
+    assert client.get(f"/api/changes?since={head['version'] + 1}").get_json()["reset"]
+    assert client.get(f"/api/changes?since={head['version']}&epoch=other").get_json()["reset"]
+    assert client.get("/api/changes?since=-1").status_code == 400
+
+
+def test_trimmed_tombstones_force_a_reset(client, load):
+    head = client.get("/api/changes").get_json()
+    # Replacing two full tables leaves more than 2 * CHANGE_LOG_TOMBSTONES
+    # tombstones, which trims the oldest ones behind a recorded floor.
+    size = scoreatlas.CHANGE_LOG_TOMBSTONES + scoreatlas.CHANGE_LOG_TOMBSTONES // 20
+    for prefix in ("first", "second"):
+        load(make_students(size, seed=16, prefix=prefix))
+    students = load(make_students(10, seed=17, prefix="third"))
+
+    with scoreatlas.app.app_context():
+        db = scoreatlas.get_db()
+        tombstones = db.execute("SELECT COUNT(1) FROM change_log WHERE deleted = 1").fetchone()[0]
+        trimmed = db.execute("SELECT trimmed_seq FROM data_version WHERE id = 1").fetchone()[0]
+    assert tombstones <= 2 * scoreatlas.CHANGE_LOG_TOMBSTONES
+    assert trimmed > head["version"]
+    assert client.get(f"/api/changes?since={head['version']}&epoch={head['epoch']}").get_json()["reset"]
+
+    # Versions past the floor still replay.
+    since = client.get("/api/changes").get_json()["version"]
+    mirror = table(client)
+    client.delete(f"/api/students/{students[0]['id']}")
+    replay(client, mirror, since, head["epoch"])
+    assert mirror == table(client)
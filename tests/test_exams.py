@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import make_students, scoreatlas
+
+
+@pytest.mark.parametrize(
+    ("label", "query"),
+    [
+        ("all", ""),
+        ("total", "min_total=380&max_total=400"),
+        ("keyword", "keyword=a00"),
+        ("subject", "math_min=75&math_max=80"),
+    ],
+)
+def test_cross_exam_stats_match_a_single_database(client, load, create_exam, label, query):
+    parts = [make_students(90, seed=33, prefix="a"), make_students(70, seed=34, prefix="b")]
+    exam_ids = []
+    for index, students in enumerate(parts):
+        exam_ids.append(create_exam(f"merge-{label}-{index}"))
+        load(students, exam=exam_ids[-1])
+    union = create_exam(f"merge-{label}-union")
+    load([student for students in parts for student in students], exam=union)
+
+    merged = client.get(f"/api/stats?exams={','.join(exam_ids)}&{query}").get_json()
+    single = client.get(f"/api/exams/{union}/stats?series=0&{query}").get_json()
+
+    assert single["count"] > 0
+    assert [part["exam"] for part in merged["exams"]] == exam_ids
+    assert sum(part["count"] for part in merged["exams"]) == single["count"]
+    assert [student["total"] for student in merged["top10"]] == [student["total"] for student in single["top10"]]
+    for key in single:
+        if key != "top10":
+            assert merged[key] == single[key], key
+
+
+def test_catalog_count_follows_only_student_count_writes(client, load, create_exam, monkeypatch):
+    exam_id = create_exam("catalog-count")
+    students = load(make_students(25, seed=35), exam=exam_id)
+    recorded: list[str] = []
+    record = scoreatlas.record_exam_count
+    monkeypatch.setattr(scoreatlas, "record_exam_count", lambda exam: (recorded.append(exam), record(exam)))
+
+    def count() -> int:
+        return next(exam["count"] for exam in client.get("/api/exams").get_json()["exams"] if exam["id"] == exam_id)
+
+    prefix = f"/api/exams/{exam_id}"
+    client.patch(f"{prefix}/students/{students[0]['id']}/subject", json={"subject": "math", "score": 1})
+    client.post(f"{prefix}/dashboard", json={"filters": [{"min_total": 300}]})
+    assert recorded == []
+
+    client.post(f"{prefix}/students", json=make_students(1, seed=36, prefix="extra")[0])
+    client.delete(f"{prefix}/students/{students[1]['id']}")
+    client.delete(f"{prefix}/students/{students[2]['id']}")
+    assert recorded == [exam_id] * 3
+    assert count() == 24
+
+    client.post(f"{prefix}/students/batch", json={"operations": [{"op": "delete", "id": students[3]["id"]}]})
+    assert count() == 23
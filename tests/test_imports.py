@@ -0,0 +1,134 @@
+import io
+import json
+import sqlite3
+from typing import Any, Callable
+
+from conftest import make_students, scoreatlas
+
+
+def ndjson(students: list[dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(student, ensure_ascii=False) + "\n" for student in students).encode("utf-8")
+
+
+def import_stream(client: Any, mode: str, body: bytes) -> Any:
+    return client.post(f"/api/import/stream?mode={mode}&format=ndjson", data=body, content_type="application/x-ndjson")
+
+
+def by_name(client: Any) -> dict[str, dict[str, Any]]:
+    return {student["name"]: student for student in client.get("/api/students").get_json()["students"]}
+
+
+def test_replace_import_swaps_the_table(client, load):
+    load(make_students(20, seed=3, prefix="old"))
+    incoming = make_students(15, seed=4, prefix="new")
+
+    response = import_stream(client, "replace", ndjson(incoming))
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report["inserted"], report["updated"], report["rejected"]) == (15, 0, 0)
+    assert sorted(by_name(client)) == sorted(student["name"] for student in incoming)
+    assert client.get("/api/stats?series=0").get_json()["count"] == 15
+
+
+def test_replace_import_without_valid_rows_keeps_the_table(client, load):
+    before = load(make_students(12, seed=5))
+
+    response = import_stream(client, "replace", b'{"name": "bad", "math": 999}\nnot json\n')
+    assert response.status_code == 400
+    report = response.get_json()
+    assert report["inserted"] == 0
+    assert report["rejected"] == 2
+    assert client.get("/api/students").get_json()["students"] == before
+
+    response = client.post("/api/import/json", json={"replace": True, "students": []})
+    assert response.status_code == 400
+    assert client.get("/api/students").get_json()["students"] == before
+
+
+def test_upsert_import_updates_and_inserts(client, load):
+    existing = make_students(10, seed=6)
+    load(existing)
+    changed = {**existing[0], "math": 0}
+    added = make_students(1, seed=7, prefix="added")[0]
+
+    response = import_stream(client, "upsert", ndjson([changed, added]))
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report["inserted"], report["updated"], report["rejected"]) == (1, 1, 0)
+
+    students = by_name(client)
+    assert len(students) == 11
+    assert students[changed["name"]]["math"] == 0
+    assert students[changed["name"]]["total"] == sum(changed[code] for code in scoreatlas.SUBJECT_CODES)
+    assert added["name"] in students
+
+
+def test_append_import_rejects_bad_and_duplicate_rows(client, load):
+    existing = make_students(5, seed=8)
+    load(existing)
+    fresh = make_students(2, seed=9, prefix="fresh")
+    body = ndjson([fresh[0], existing[1], {"name": "no-scores"}, fresh[1]]) + b"{broken\n"
+
+    response = import_stream(client, "append", body)
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report["inserted"], report["rejected"]) == (2, 3)
+    assert sorted(error["line"] for error in report["errors"]) == [2, 3, 5]
+    assert len(by_name(client)) == 7
+
+
+def test_import_rejects_unknown_mode(client):
+    assert import_stream(client, "merge", b"").status_code == 400
+
+
+class ProbedUpload(io.BytesIO):
+    # Runs `probe` once, after part of the body has been read: the import is
+    # then mid-stream with earlier batches already staged.
+    def __init__(self, body: bytes, probe: Callable[[], None]) -> None:
+        super().__init__(body)
+        self.probe = probe
+
+    def check(self) -> None:
+        if self.probe is not None and self.tell() > len(self.getvalue()) // 2:
+            probe, self.probe = self.probe, None
+            probe()
+
+    def read(self, size: int | None = -1) -> bytes:
+        self.check()
+        return super().read(size)
+
+    def read1(self, size: int = -1) -> bytes:
+        self.check()
+        return super().read1(size)
+
+    def readinto(self, buffer: Any) -> int:
+        self.check()
+        return super().readinto(buffer)
+
+
+def test_replace_import_does_not_hold_the_write_lock_while_streaming(client, load):
+    load(make_students(10, seed=10))
+    incoming = make_students(2000, seed=11, prefix="streamed")
+    writable: list[bool] = []
+
+    def probe() -> None:
+        other = sqlite3.connect(scoreatlas.DB_PATH, timeout=0)
+        try:
+            other.execute("BEGIN IMMEDIATE")
+            other.rollback()
+            writable.append(True)
+        except sqlite3.OperationalError:
+            writable.append(False)
+        finally:
+            other.close()
+
+    body = ndjson(incoming)
+    response = client.post(
+        "/api/import/stream?mode=replace&format=ndjson&batch_size=50",
+        input_stream=ProbedUpload(body, probe),
+        content_length=len(body),
+        content_type="application/x-ndjson",
+    )
+    assert response.status_code == 200
+    assert writable == [True]
+    assert sorted(by_name(client)) == sorted(student["name"] for student in incoming)
@@ -0,0 +1,45 @@
+from typing import Any
+
+import pytest
+
+from conftest import make_students
+
+
+def walk_pages(client: Any, query: str, page_size: int) -> list[dict[str, Any]]:
+    students: list[dict[str, Any]] = []
+    cursor = None
+    while True:
+        url = f"/api/students?page_size={page_size}&{query}"
+        if cursor:
+            url += f"&cursor={cursor}"
+        page = client.get(url).get_json()
+        students.extend(page["students"])
+        cursor = page["next"]
+        if cursor is None:
+            return students
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "",
+        "sort=math",
+        "sort=total&order=asc",
+        "sort=physics&order=asc",
+        "min_total=380&max_total=400",
+        "keyword=s01",
+    ],
+)
+def test_cursor_traversal_matches_unpaginated_order(client, load, query):
+    load(make_students(157, seed=1))
+    expected = client.get(f"/api/students?{query}").get_json()["students"]
+    assert expected
+
+    for page_size in (1, 7, 50, 500):
+        assert walk_pages(client, query, page_size) == expected
+
+
+def test_bad_cursor_is_rejected(client, load):
+    load(make_students(10, seed=2))
+    response = client.get("/api/students?page_size=5&cursor=not-a-cursor")
+    assert response.status_code == 400
@@ -0,0 +1,42 @@
+import pytest
+
+from conftest import make_students, scoreatlas
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = scoreatlas.PartitionPool(2)
+    monkeypatch.setattr(scoreatlas, "partition_pool", pool)
+    monkeypatch.setattr(scoreatlas, "PARALLEL_STATS_WORKERS", 2)
+    monkeypatch.setattr(scoreatlas, "PARALLEL_STATS_MIN_ROWS", 50)
+    yield pool
+    if pool.executor is not None:
+        pool.executor.shutdown()
+
+
+def rendered(agg):
+    return scoreatlas.render_stats(agg, None, [])
+
+
+@pytest.mark.parametrize(("keyword", "min_total", "max_total"), [("", 0, 750), ("", 380, 400), ("s0", 0, 750), ("s", 385, 750)])
+def test_partitioned_aggregate_matches_one_pass(load, pool, keyword, min_total, max_total):
+    load(make_students(300, seed=51))
+    with scoreatlas.app.test_request_context():
+        if not keyword:
+            assert scoreatlas.current_column_store().view(scoreatlas.get_db(), wait=True) is not None
+        serial = scoreatlas.aggregate_columns(
+            scoreatlas.fetch_score_columns(keyword, min_total, max_total, with_names=False)
+        )
+        assert serial.count >= 50
+        parallel = scoreatlas.parallel_aggregate(keyword, min_total, max_total)
+    assert parallel is not None
+    assert rendered(parallel) == rendered(serial)
+
+
+def test_small_filtered_sets_stay_in_one_process(load, pool):
+    load(make_students(300, seed=52))
+    with scoreatlas.app.test_request_context():
+        scoreatlas.current_column_store().view(scoreatlas.get_db(), wait=True)
+        # The table is large enough; the range holds too few students.
+        assert scoreatlas.parallel_aggregate("", 415, 750) is None
+    assert pool.executor is None
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import make_students, scoreatlas
+
+SUBJECTS = ["total", *scoreatlas.SUBJECT_CODES]
+
+
+def brute_position(scores: list[int], score: int) -> dict[str, float | int]:
+    higher = sum(1 for value in scores if value > score)
+    tied = sum(1 for value in scores if value == score)
+    below = len(scores) - higher - tied
+    return {
+        "score": score,
+        "rank": higher + 1,
+        "tied": tied,
+        "atLeast": higher + tied,
+        "percentile": round((below + tied / 2) / len(scores) * 100, 2),
+    }
+
+
+@pytest.mark.parametrize("subject", SUBJECTS)
+def test_rank_and_nth_match_brute_force(client, load, subject):
+    students = load(make_students(80, seed=21))
+    scores = [student[subject] for student in students]
+
+    for student in students[::7]:
+        body = client.get(f"/api/rank/students/{student['id']}").get_json()
+        assert body["count"] == len(students)
+        assert body["ranks"][subject] == brute_position(scores, student[subject])
+
+    for score in sorted(set(scores)) + [min(scores) - 1, max(scores) + 1]:
+        body = client.get(f"/api/rank/score?subject={subject}&score={score}").get_json()
+        assert {key: body[key] for key in ("rank", "tied", "atLeast", "percentile")} == {
+            key: value for key, value in brute_position(scores, score).items() if key != "score"
+        }
+
+    ordered = sorted(scores, reverse=True)
+    for n in range(1, len(ordered) + 1):
+        body = client.get(f"/api/rank/nth?subject={subject}&n={n}").get_json()
+        assert body["score"] == ordered[n - 1]
+        assert body["rank"] <= n <= body["atLeast"]
+    assert client.get(f"/api/rank/nth?subject={subject}&n={len(ordered) + 1}").status_code == 404
+
+
+def test_rank_follows_writes(client, load):
+    students = load(make_students(40, seed=22))
+    top = max(students, key=lambda student: student["math"])
+    client.patch(f"/api/students/{top['id']}/subject", json={"subject": "math", "score": 0})
+    other = next(student for student in students if student["id"] != top["id"])
+    client.delete(f"/api/students/{other['id']}")
+
+    remaining = client.get("/api/students").get_json()["students"]
+    scores = [student["math"] for student in remaining]
+    body = client.get(f"/api/rank/students/{top['id']}").get_json()
+    assert body["count"] == len(remaining) == 39
+    assert body["ranks"]["math"] == brute_position(scores, 0)
+    assert client.get("/api/rank/nth?subject=math&n=1").get_json()["score"] == max(scores)
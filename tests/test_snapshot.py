@@ -0,0 +1,38 @@
+import json
+import os
+
+from conftest import make_students, scoreatlas
+
+
+def snapshot(tmp_path, *args):
+    runner = scoreatlas.app.test_cli_runner()
+    return runner.invoke(args=["snapshot", "--out", str(tmp_path), *args])
+
+
+def test_snapshot_refuses_the_seeded_sample(tmp_path):
+    # The suite's database starts empty, so start-up seeded the sample.
+    assert scoreatlas.app.config["SAMPLE_SEEDED"]
+    result = snapshot(tmp_path)
+    assert result.exit_code != 0
+    assert "seeded" in result.output
+    assert not os.listdir(tmp_path)
+
+
+def test_snapshot_refuses_an_empty_database(tmp_path, create_exam):
+    exam_id = create_exam("snapshot-empty")
+    result = snapshot(tmp_path, "--exam", exam_id)
+    assert result.exit_code != 0
+    assert "no students" in result.output
+    assert not os.listdir(tmp_path)
+
+
+def test_snapshot_publishes_a_real_database(tmp_path, load, create_exam):
+    exam_id = create_exam("snapshot-real")
+    load(make_students(30, seed=41), exam=exam_id)
+    result = snapshot(tmp_path, "--exam", exam_id, "--student-limit", "5")
+    assert result.exit_code == 0, result.output
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert manifest["count"] == 30
+    students = json.loads((tmp_path / manifest["students"]).read_text())["students"]
+    assert len(students) == 5